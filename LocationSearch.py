@@ -1,68 +1,21 @@
 from typing import *
-import requests
-import inquirer
-import json
-from dataclasses import dataclass, asdict
-from enum import Enum
-import math
-from strip_ansi import strip_ansi
+from dataclasses import dataclass
+from config import CONFIG, LEETROUTE_VERSION, LOCSEARCH_DEBUGGING
+from metrics import timed, increment
+from cache import LRUCache
+from admission import UPSTREAMS, throttled
+from geodesy import Point
+import time
 
+# requests is imported inside the search functions so that importing this
+# module for its dataclasses doesn't pay for it; terminal prompts live in cli.py
 
-with open("config.json", "r") as f:
-    CONFIG = json.load(f)
-__VERSION_ROOT = CONFIG.get("version")
-__DEBUGGING_ROOT = CONFIG.get("debugging")
-
-LEETROUTE_VERSION = __VERSION_ROOT.get("base")
-ENGINE_VERSION = __VERSION_ROOT.get("engine")
-WEBAPP_VERSION = __VERSION_ROOT.get("webapp")
-
-ENGINE_DEBUGGING = __DEBUGGING_ROOT.get("engine")
-LOCSEARCH_DEBUGGING = __DEBUGGING_ROOT.get("LocationSearch")
-WEBAPP_DEBUGGING = __DEBUGGING_ROOT.get("webapp")
-
-
-class DistanceUnit(Enum):
-    MILES = "miles"
-    KILOMETERS = "kilometers"
-
-@dataclass
-class Point:
-    lat: float | int=0
-    lon: float | int=0
-    
-    def rad(self) -> Self:
-        return Point(math.radians(self.lat), math.radians(self.lon))
-
-    def distance(self, other: Self, unit: DistanceUnit) -> float:
-        R = 3959 if unit == "miles" else 6357
-
-        dlat = self.rad().lat - other.rad().lat
-        dlon = self.rad().lon - other.rad().lon
-        h = 2 * math.asin( math.sqrt( (math.sin(dlat / 2)**2) + math.cos(self.rad().lat) * math.cos(other.rad().lat) * (math.sin(dlon / 2)**2) ) )
-        d = h * R
-
-        return d
-    
-    def bearing(self, other: Self) -> float:
-        p1 = self.rad()
-        p2 = other.rad()
-        dlon = p2.lon - p1.lon
-        x = math.sin(dlon) * math.cos(p2.lat)
-        y = math.cos(p1.lat) * math.sin(p2.lat) - math.sin(p1.lat) * math.cos(p2.lat) * math.cos(dlon)
-        bearing = math.atan2(x, y)
-        return math.degrees(bearing)
-    
-    @classmethod
-    def from_tuple(cls, data: tuple[float,float]) -> Self:
-        return cls(*data)
-    
-    def to_tuple(self, swap: bool=False) -> tuple[float,float]:
-        return (self.lon, self.lat) if swap else (self.lat, self.lon)
-
-    def __repr__(self) -> str:
-        return f"Point({self.lat}, {self.lon})"
-
+__PHOTON_ROOT = CONFIG.get("photon", {})
+PHOTON_URL = __PHOTON_ROOT.get("base_url", "https://photon.komoot.io").rstrip("/")
+SEARCH_TTL = __PHOTON_ROOT.get("search_ttl_s", 300)
+REVERSE_TTL = __PHOTON_ROOT.get("reverse_ttl_s", 86400)
+SEARCH_CACHE = LRUCache("photon_search", __PHOTON_ROOT.get("search_cache_size", 1024))
+REVERSE_CACHE = LRUCache("photon_reverse", __PHOTON_ROOT.get("reverse_cache_size", 1024))
 
 
 @dataclass
@@ -88,19 +41,60 @@ def debug(content: str) -> None:
         print(f"\x1b[35m[DEBUG: {__file__}] {content}\x1b[0m")
 
 
-def search_map(query: str, priority_pos: Optional[tuple[float, float]] = None, limit: int = 15) -> dict[str, Any]:
-    """Perform a search using Komoot Photon
+def _get_json(url: str, params: dict[str, Any]) -> dict[str, Any]:
+    import requests
 
-    Args:
-        query (str): Query to search
-        priority_pos (Optional[tuple[float, float]], optional): Set a location to prioritize results that are near. Normal sorting is applied if left blank or set to `False` Defaults to None.
-        limit (int, optional): How many search results to return (max 50). Defaults to 15.
+    headers = {
+        "User-Agent": f"leetRoute/{LEETROUTE_VERSION}"
+    }
+    response = requests.get(url, params=params, headers=headers)
+    response.raise_for_status()
+    return response.json()
 
-    Returns:
-        dict[str, Any]
+
+def _photon_get(upstream: str, url: str, params: dict[str, Any], cache: LRUCache, ttl: float) -> dict[str, Any]:
+    """GET a Photon endpoint through its admission limiter, with a TTL cache
+
+    If the upstream is throttled (shed locally or answering 429/503), an expired
+    cache entry is served rather than failing the request.
     """
-    
-    url = "https://photon.komoot.io/api/"
+    key = tuple(sorted(params.items()))
+    cached = cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    try:
+        res = UPSTREAMS[upstream].call(_get_json, url, params)
+    except Exception as e:
+        return _stale_or_raise(upstream, cached, e)
+    cache.put(key, (time.monotonic(), res))
+    return res
+
+
+async def _photon_get_async(upstream: str, url: str, params: dict[str, Any], cache: LRUCache, ttl: float) -> dict[str, Any]:
+    """`_photon_get` without blocking the event loop, sharing its caches"""
+    import outbound
+
+    key = tuple(sorted(params.items()))
+    cached = cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    try:
+        res = await UPSTREAMS[upstream].call_async(outbound.get_json, url, params)
+    except Exception as e:
+        return _stale_or_raise(upstream, cached, e)
+    cache.put(key, (time.monotonic(), res))
+    return res
+
+
+def _stale_or_raise(upstream: str, cached: tuple[float, dict] | None, e: Exception) -> dict[str, Any]:
+    if cached is not None and throttled(e):
+        debug(f"{upstream} throttled, serving stale result: {e}")
+        increment("stale_served", upstream=upstream)
+        return cached[1]
+    raise e
+
+
+def _search_params(query: str, priority_pos: Optional[tuple[float, float]], limit: int) -> dict[str, Any]:
     params = {
         "q": query,
         "limit": limit
@@ -110,28 +104,46 @@ def search_map(query: str, priority_pos: Optional[tuple[float, float]] = None, l
         lat, lon = priority_pos
         params["lat"] = lat
         params["lon"] = lon
+    return params
 
-    headers = {
-        "User-Agent": f"leetRoute/{LEETROUTE_VERSION}"
-    }
 
-    response = requests.get(url, params=params, headers=headers)
-    response.raise_for_status()
-    res = response.json()
-    res["query"] = query
-    return res
+def _reverse_params(coord: Point, limit: int) -> dict[str, Any]:
+    return {
+        "lon": coord.lat,
+        "lat": coord.lon,
+        "limit": limit
+    }
 
 
-def debug(content: str) -> None:
-    """Send a debug message to the console
+@timed("photon.search")
+def search_map(query: str, priority_pos: Optional[tuple[float, float]] = None, limit: int = 15) -> dict[str, Any]:
+    """Perform a search using Komoot Photon
 
     Args:
-        content (str): content to include
+        query (str): Query to search
+        priority_pos (Optional[tuple[float, float]], optional): Set a location to prioritize results that are near. Normal sorting is applied if left blank or set to `False` Defaults to None.
+        limit (int, optional): How many search results to return (max 50). Defaults to 15.
+
+    Returns:
+        dict[str, Any]
     """
-    if ENGINE_DEBUGGING:
-        print(f"\x1b[35m[DEBUG: {__file__}] {content}\x1b[0m")
+    
+    params = _search_params(query, priority_pos, limit)
+    res = dict(_photon_get("photon", f"{PHOTON_URL}/api/", params, SEARCH_CACHE, SEARCH_TTL))
+    res["query"] = query
+    return res
 
 
+@timed("photon.search")
+async def search_map_async(query: str, priority_pos: Optional[tuple[float, float]] = None, limit: int = 15) -> dict[str, Any]:
+    """`search_map` for the ASGI serving mode; results land in the same cache"""
+    params = _search_params(query, priority_pos, limit)
+    res = dict(await _photon_get_async("photon", f"{PHOTON_URL}/api/", params, SEARCH_CACHE, SEARCH_TTL))
+    res["query"] = query
+    return res
+
+
+@timed("photon.reverse")
 def reverse_geocode(coord: Point, limit: int=1) -> dict[str, Any]:
     """Perform a reverse-geocode search using Komoot Photon
 
@@ -143,21 +155,15 @@ def reverse_geocode(coord: Point, limit: int=1) -> dict[str, Any]:
         dict[str, Any]
     """
 
-    url = "https://photon.komoot.io/reverse"
-    params = {
-        "lon": coord.lat,
-        "lat": coord.lon,
-        "limit": limit
-    }
+    params = _reverse_params(coord, limit)
+    return dict(_photon_get("photon", f"{PHOTON_URL}/reverse", params, REVERSE_CACHE, REVERSE_TTL))
 
-    headers = {
-        "User-Agent": f"leetRoute/{LEETROUTE_VERSION}"
-    }
 
-    response = requests.get(url, params=params, headers=headers)
-    response.raise_for_status()
-    res = response.json()
-    return res
+@timed("photon.reverse")
+async def reverse_geocode_async(coord: Point, limit: int=1) -> dict[str, Any]:
+    """`reverse_geocode` for the ASGI serving mode; results land in the same cache"""
+    params = _reverse_params(coord, limit)
+    return dict(await _photon_get_async("photon", f"{PHOTON_URL}/reverse", params, REVERSE_CACHE, REVERSE_TTL))
 
 def format_results(results: dict[str, Any], ansi: bool=True) -> tuple[list[dict[str, Any]], list[Location]]:
     """
@@ -297,56 +303,3 @@ def format_results(results: dict[str, Any], ansi: bool=True) -> tuple[list[dict[
     ]
 
     return question_dicts, locations
-
-
-def prompt_results(results: dict[str, Any]) -> Any:
-    question_dicts, locations = format_results(results)
-
-    # Convert each question dict into inquirer question objects (load_from_dict expects one question dict)
-    question_objs: list[Any] = []
-    for qd in question_dicts:
-        loaded = inquirer.load_from_dict(qd)
-        # load_from_dict may return a list or a single question object depending on version; handle both.
-        if isinstance(loaded, list):
-            question_objs.extend(loaded)
-        else:
-            question_objs.append(loaded)
-
-    # Now prompt the user
-    answers = inquirer.prompt(question_objs)
-    if not answers:
-        print("No answer (possibly user aborted).")
-        return None
-
-    # answers['destination'] will be the index (because we used (label, index) pairs)
-    idx = answers.get("destination")
-    if idx is None:
-        print("No destination chosen.")
-        return None
-
-    # map back to Location
-    try:
-        chosen_location = locations[int(idx)]
-    except (IndexError, ValueError, TypeError):
-        print("Invalid selection returned by inquirer:", idx)
-        return None
-
-    print("You chose:", chosen_location.displayname)   # uses __repr__ -> displayname
-    print("Plain name:", chosen_location.name)
-    print("Coords:", chosen_location.coords)
-    return chosen_location
-
-
-def prompt_search(query: str, priority_pos: Optional[tuple[float, float]] = None, limit: int = 15) -> Location | None:
-    res = search_map(query=query, priority_pos=priority_pos, limit=limit)
-    # with open("res.json", "w", encoding="utf-8") as f:
-    #     json.dump(res, f, indent=4)
-    loc = prompt_results(res)
-    return loc
-
-
-# if __name__ == "__main__":
-#     res = search_map("490 Tanglewood Drive Middleville", limit=100)
-#     with open("res.json", "w", encoding="utf-8") as f:
-#         json.dump(res, f, indent=4)
-#     prompt_results(res)
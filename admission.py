@@ -0,0 +1,209 @@
+import time
+import heapq
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable
+from config import CONFIG
+from metrics import span, increment
+
+
+__ADMISSION_ROOT = CONFIG.get("admission", {})
+
+# lower number = served first when several requests are queued for the same upstream
+PRIORITY_CALCULATE = 0
+PRIORITY_AUTOCOMPLETE = 1
+
+# how often a queued coroutine re-checks whether it is at the head of the queue
+ASYNC_POLL_S = __ADMISSION_ROOT.get("async_poll_ms", 10) / 1000
+
+_priority: ContextVar[int] = ContextVar("admission_priority", default=PRIORITY_CALCULATE)
+
+
+class Overloaded(Exception):
+    """An upstream call was shed because its queue was full or its deadline passed"""
+
+    def __init__(self, upstream: str, reason: str) -> None:
+        super().__init__(f"{upstream} is overloaded ({reason})")
+        self.upstream = upstream
+        self.reason = reason
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `burst`. Not thread-safe on its own"""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token if one is available
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until the next one is due
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Upstream:
+    """Admission control for one upstream service
+
+    Callers queue for a token from the upstream's bucket, highest priority first and
+    then in arrival order. When `max_queue` callers are already waiting, the newest
+    lowest-priority waiter is shed with `Overloaded` to make room for a higher-priority
+    arrival; otherwise the arrival itself is shed. A caller is also shed once it has
+    waited `timeout` seconds, or `autocomplete_timeout` for autocomplete requests.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_queue: int, timeout: float, autocomplete_timeout: float | None=None) -> None:
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.autocomplete_timeout = timeout if autocomplete_timeout is None else autocomplete_timeout
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[int, int]] = []
+        self._evicted: set[tuple[int, int]] = set()
+        self._seq = 0
+
+    def _deadline(self, priority: int, timeout: float | None) -> float:
+        if timeout is None:
+            timeout = self.autocomplete_timeout if priority == PRIORITY_AUTOCOMPLETE else self.timeout
+        return time.monotonic() + timeout
+
+    def _enqueue(self, priority: int) -> tuple[int, int]:
+        # caller holds self._cond
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters, default=None)
+            if worst is None or worst[0] <= priority:
+                increment("admission", upstream=self.name, result="shed")
+                raise Overloaded(self.name, "queue full")
+            # make room by shedding the newest of the lowest-priority waiters; it notices on its next poll
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            self._evicted.add(worst)
+            self._cond.notify_all()
+        self._seq += 1
+        entry = (priority, self._seq)
+        heapq.heappush(self._waiters, entry)
+        return entry
+
+    def _poll(self, entry: tuple[int, int], deadline: float) -> float | None:
+        """None once `entry` is admitted, otherwise how long to wait before polling again. Caller holds self._cond"""
+        if entry in self._evicted:
+            increment("admission", upstream=self.name, result="shed")
+            raise Overloaded(self.name, "queue full")
+        wait = None
+        if self._waiters[0] == entry:
+            wait = self.bucket.take()
+            if wait == 0:
+                increment("admission", upstream=self.name, result="admitted")
+                return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            increment("admission", upstream=self.name, result="timeout")
+            raise Overloaded(self.name, "deadline passed")
+        return min(wait, remaining) if wait else remaining
+
+    def _leave(self, entry: tuple[int, int]) -> None:
+        # caller holds self._cond
+        if entry in self._evicted:
+            self._evicted.discard(entry)
+            return
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def acquire(self, priority: int | None=None, timeout: float | None=None) -> None:
+        """Block until this caller may make one request
+
+        Args:
+            priority (int | None, optional): queue priority. Defaults to the current request's priority.
+            timeout (float | None, optional): seconds to wait at most. Defaults to the upstream's timeout for the priority.
+
+        Raises:
+            Overloaded: the queue is full, a higher-priority caller took this one's place, or the deadline passed
+        """
+        priority = _priority.get() if priority is None else priority
+        deadline = self._deadline(priority, timeout)
+        with self._cond:
+            entry = self._enqueue(priority)
+            try:
+                while (wait := self._poll(entry, deadline)) is not None:
+                    self._cond.wait(wait)
+            finally:
+                self._leave(entry)
+
+    async def acquire_async(self, priority: int | None=None, timeout: float | None=None) -> None:
+        """`acquire` for coroutines: waits on the event loop instead of holding a thread
+
+        Shares the queue with threaded callers, so priorities hold across both modes.
+        """
+        import asyncio
+
+        priority = _priority.get() if priority is None else priority
+        deadline = self._deadline(priority, timeout)
+        with self._cond:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._poll(entry, deadline)
+                if wait is None:
+                    return
+                await asyncio.sleep(min(wait, ASYNC_POLL_S))
+        finally:
+            with self._cond:
+                self._leave(entry)
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` once admitted
+
+        The callable is whatever actually talks to the upstream, so a stub that just
+        sleeps can stand in for it to simulate upstream latency.
+        """
+        self.acquire()
+        with span(f"upstream.{self.name}"):
+            return func(*args, **kwargs)
+
+    async def call_async(self, func: Callable, *args, **kwargs) -> Any:
+        """Await `func(*args, **kwargs)` once admitted"""
+        await self.acquire_async()
+        with span(f"upstream.{self.name}"):
+            return await func(*args, **kwargs)
+
+
+def _build_upstreams() -> dict[str, Upstream]:
+    defaults = {
+        # search and reverse geocoding share one Photon quota, so autocomplete and
+        # route calculations compete in the same queue
+        "photon": {"rate": 5, "burst": 10, "max_queue": 50, "timeout": 10, "autocomplete_timeout": 2},
+        "ors": {"rate": 0.6, "burst": 5, "max_queue": 50, "timeout": 30},
+        "blob": {"rate": 10, "burst": 20, "max_queue": 100, "timeout": 30},
+    }
+    configured = __ADMISSION_ROOT.get("upstreams", {})
+    return {name: Upstream(name, **{**limits, **configured.get(name, {})}) for name, limits in defaults.items()}
+
+
+UPSTREAMS = _build_upstreams()
+
+
+def set_priority(priority: int) -> None:
+    """Set the queue priority for upstream calls made while handling the current request"""
+    _priority.set(priority)
+
+
+def throttled(exc: BaseException) -> bool:
+    """Whether an error means an upstream is out of capacity, so a stale cached answer is better than none"""
+    if isinstance(exc, Overloaded):
+        return True
+    # requests errors carry the response; aiohttp errors carry the status itself
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", getattr(exc, "status", None)) in (429, 503)
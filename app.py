@@ -1,27 +1,22 @@
 from flask import *
 from LocationSearch import search_map, format_results
-from engine import main as get_and_export_directions, Point
+from engine import main as get_and_export_directions, recalculate, Point, SESSIONS
+from config import LEETROUTE_VERSION, ENGINE_VERSION, WEBAPP_VERSION, WEBAPP_DEBUGGING
+import metrics
+import profiling
+import overlay
+import httpcache
+import admission
+from werkzeug.security import safe_join
 import json
 from pathlib import Path
 from dataclasses import asdict
 from os import remove
 from sys import argv
 
-with open("config.json", "r") as f:
-    CONFIG = json.load(f)
-__VERSION_ROOT = CONFIG.get("version")
-__DEBUGGING_ROOT = CONFIG.get("debugging")
-
-LEETROUTE_VERSION = __VERSION_ROOT.get("base")
-ENGINE_VERSION = __VERSION_ROOT.get("engine")
-WEBAPP_VERSION = __VERSION_ROOT.get("webapp")
-
-ENGINE_DEBUGGING = __DEBUGGING_ROOT.get("engine")
-LOCSEARCH_DEBUGGING = __DEBUGGING_ROOT.get("LocationSearch")
-WEBAPP_DEBUGGING = __DEBUGGING_ROOT.get("webapp")
-
 app = Flask(__name__)
 app.debug = True
+httpcache.init_app(app)
 start_results = None
 dest_results = None
 
@@ -36,6 +31,30 @@ def debug(content: str) -> None:
         print(f"\x1b[35m[DEBUG: {__file__}] {content}\x1b[0m")
 
 
+@app.before_request
+def start_request_timing():
+    metrics.start_request()
+    # route calculations queue ahead of autocomplete when an upstream is saturated
+    if request.endpoint in ("predictive_search", "index"):
+        admission.set_priority(admission.PRIORITY_AUTOCOMPLETE)
+    else:
+        admission.set_priority(admission.PRIORITY_CALCULATE)
+
+
+@app.after_request
+def add_timing_header(response: Response) -> Response:
+    server_timing = metrics.finish_request()
+    if server_timing:
+        response.headers["Server-Timing"] = server_timing
+    return response
+
+
+@app.errorhandler(admission.Overloaded)
+def upstream_overloaded(e: admission.Overloaded):
+    debug(f"Shed request: {e}")
+    return jsonify({"error": str(e), "upstream": e.upstream}), 503, {"Retry-After": "1"}
+
+
 @app.route("/", methods=["GET"])
 def index():
     global start_results, dest_results
@@ -70,39 +89,43 @@ def predictive_search():
         return jsonify([])
     
     try:
-        results = search_map(query, limit=10)
-        formatted_data, locations = format_results(results, ansi=False)
-        
-        # formatted_data is a list containing one dict with 'choices' key
-        if isinstance(formatted_data, list) and len(formatted_data) > 0:
-            result_dict = formatted_data[0]
-            choices = result_dict.get('choices', [])
-        elif isinstance(formatted_data, dict):
-            choices = formatted_data.get('choices', [])
-        else:
-            debug(f"Unexpected formatted_data type: {type(formatted_data)}")
-            return jsonify([])
-        
-        # Return list of predictions with name and coordinates
-        predictions = []
-        for choice in choices:
-            # choice is a tuple like (text, index)
-            if isinstance(choice, tuple) and len(choice) >= 2:
-                text = choice[0]
-                idx = choice[1]
-                
-                if idx < len(locations):
-                    loc = locations[idx]
-                    predictions.append({
-                        "name": text,
-                        "index": idx,
-                        "coords": {
-                            "lat": loc.coords.lat,
-                            "lon": loc.coords.lon
-                        }
-                    })
-        
-        return jsonify(predictions)
+        with profiling.profile_request("predictiveSearch", profiling.is_requested(request.args, request.headers)):
+            results = search_map(query, limit=10)
+            formatted_data, locations = format_results(results, ansi=False)
+            
+            # formatted_data is a list containing one dict with 'choices' key
+            if isinstance(formatted_data, list) and len(formatted_data) > 0:
+                result_dict = formatted_data[0]
+                choices = result_dict.get('choices', [])
+            elif isinstance(formatted_data, dict):
+                choices = formatted_data.get('choices', [])
+            else:
+                debug(f"Unexpected formatted_data type: {type(formatted_data)}")
+                return jsonify([])
+            
+            # Return list of predictions with name and coordinates
+            predictions = []
+            for choice in choices:
+                # choice is a tuple like (text, index)
+                if isinstance(choice, tuple) and len(choice) >= 2:
+                    text = choice[0]
+                    idx = choice[1]
+                    
+                    if idx < len(locations):
+                        loc = locations[idx]
+                        predictions.append({
+                            "name": text,
+                            "index": idx,
+                            "coords": {
+                                "lat": loc.coords.lat,
+                                "lon": loc.coords.lon
+                            }
+                        })
+            
+            return jsonify(predictions)
+    except admission.Overloaded as e:
+        debug(f"Predictive search shed: {e}")
+        return jsonify([]), 503, {"Retry-After": "1"}
     except Exception as e:
         debug(f"Predictive search error: {e}")
         import traceback
@@ -152,7 +175,10 @@ def calculate_page():
     if start and dest:
         sp = Point(*map(float, start.split(",")))
         dp = Point(*map(float, dest.split(",")))
-        results = get_and_export_directions(start=sp, dest=dp)
+        # optional via-points, in order: /calculate?s=..&v=..&v=..&d=..
+        vps = [Point(*map(float, v.split(","))) for v in args.getlist("v")]
+        with profiling.profile_request("calculate", profiling.is_requested(args, request.headers)):
+            results = get_and_export_directions(start=sp, dest=dp, via=vps)
     else:
         results = {}
 
@@ -164,6 +190,100 @@ def calculate_page():
         base_version=LEETROUTE_VERSION
     )
 
+@app.route("/recalculate", methods=["GET"])
+def recalculate_route():
+    """Re-route after the user drags one stop of an already calculated route"""
+    args = request.args
+    route_id = args.get("id")
+    which = args.get("t")
+    point = args.get("p")
+    if not route_id:
+        return {"error": "no route id given"}, 400
+    if which not in ("start", "dest", "via"):
+        return {"error": "location type must be 'start', 'dest' or 'via'"}, 400
+    if not point:
+        return {"error": "no point given"}, 400
+
+    try:
+        lon, lat = map(float, point.split(","))
+    except ValueError:
+        return {"error": "point must be given as 'lon,lat'"}, 400
+    try:
+        via_index = int(args.get("i", 0))
+    except ValueError:
+        return {"error": "via-point index must be an integer"}, 400
+
+    p = Point(lon, lat)
+    try:
+        with profiling.profile_request("recalculate", profiling.is_requested(args, request.headers)):
+            results = recalculate(
+                route_id,
+                which,
+                p,
+                via_index=via_index,
+                insert=args.get("insert") in ("1", "true")
+            )
+    except KeyError:
+        return {"error": f"unknown or expired route id '{route_id}'"}, 404
+    except IndexError as e:
+        return {"error": str(e)}, 400
+    return jsonify(results)
+
+@app.route("/overlay/<route_id>", methods=["GET"])
+def overlay_info(route_id: str):
+    """Bounds and version of a calculated route, for the map preview to fit to"""
+    session = SESSIONS.get(route_id)
+    if session is None:
+        return {"error": f"unknown or expired route id '{route_id}'"}, 404
+    route = session.route
+    lats = [c[0] for c in route.polyline]
+    lons = [c[1] for c in route.polyline]
+    return {
+        "route_id": route_id,
+        "version": overlay.route_version(route.geometry),
+        "bbox": [min(lons), min(lats), max(lons), max(lats)],
+        "max_zoom": overlay.MAX_ZOOM
+    }
+
+@app.route("/overlay/<route_id>/<int:z>/<int:x>/<int:y>.json", methods=["GET"])
+def overlay_tile(route_id: str, z: int, x: int, y: int):
+    """Route geometry simplified for zoom `z` and cut to one map tile"""
+    if z > overlay.MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return {"error": f"tile {z}/{x}/{y} is out of range"}, 400
+    session = SESSIONS.get(route_id)
+    if session is None:
+        return {"error": f"unknown or expired route id '{route_id}'"}, 404
+    route = session.route
+    etag, body = overlay.tile(route_id, route.geometry, route.polyline, z, x, y)
+
+    response = Response(body, mimetype="application/geo+json")
+    response.set_etag(etag)
+    # a recalculation replaces the route under the same id, so always revalidate
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape endpoint for stage latencies and cache hit ratios"""
+    if not metrics.METRICS_ENABLED:
+        return {"error": "metrics are disabled"}, 404
+    if not metrics.scrape_allowed(request.headers.get("Authorization")):
+        return {"error": "a valid METRICS_TOKEN bearer token is required"}, 401
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/profiles", methods=["GET"])
+def profiles_page():
+    """Index of recently captured request profiles"""
+    if not profiling.PROFILING_ENABLED:
+        return {"error": "profiling is disabled"}, 404
+    return render_template(
+        'profiles.html.jinja',
+        profiles=profiling.list_profiles(),
+        webapp_version=WEBAPP_VERSION,
+        engine_version=ENGINE_VERSION,
+        base_version=LEETROUTE_VERSION
+    )
+
 @app.route("/exports/<path:filename>", methods=["GET"])
 def download(filename: str):
     filepath = Path(app.root_path).joinpath("exports")
@@ -177,7 +297,16 @@ def download(filename: str):
             mimetype = "application/gpx"
         case _:
             mimetype = "text/plain"
-    return send_from_directory(filepath, filename, as_attachment=True, mimetype=mimetype)
+    fullpath = safe_join(str(filepath), filename)
+    if fullpath is None or not Path(fullpath).is_file():
+        abort(404)
+    # export names end in a hash of the route geometry, so a name never gets new content
+    response = send_from_directory(
+        filepath, filename, as_attachment=True, mimetype=mimetype,
+        etag=httpcache.file_hash(Path(fullpath)), max_age=httpcache.STATIC_MAX_AGE
+    )
+    response.cache_control.immutable = True
+    return response
 
 @app.route("/exports/<path:filename>", methods=["DELETE"])
 def remove_remote(filename: str):
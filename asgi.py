@@ -0,0 +1,186 @@
+import io
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from config import CONFIG
+import admission
+import outbound
+from app import app as flask_app, debug
+from engine import Point, prefetch_route, prefetch_recalculate
+from LocationSearch import search_map_async
+
+
+__ASGI_ROOT = CONFIG.get("asgi", {})
+
+# threads that run the Flask views once their upstream I/O has been prefetched
+WORKER_THREADS = __ASGI_ROOT.get("worker_threads", 16)
+WORKERS = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="leetroute-view")
+
+AUTOCOMPLETE_PATHS = ("/", "/predictiveSearch")
+
+
+async def prefetch(path: str, args: dict[str, list[str]]) -> None:
+    """Await the Photon and ORS calls a request's Flask view is about to make
+
+    Their results land in the same caches the view reads, so when the view runs on a
+    worker thread it finds everything cached and never waits on the network.
+
+    Args:
+        path (str): request path
+        args (dict[str, list[str]]): parsed query string
+    """
+    def arg(name: str) -> str | None:
+        return (args.get(name) or [None])[0]
+
+    match path:
+        case "/predictiveSearch":
+            query = arg("q")
+            if query and len(query) >= 2:
+                await search_map_async(query, limit=10)
+        case "/":
+            start, dest = arg("s"), arg("d")
+            if start and dest:
+                await asyncio.gather(search_map_async(start, limit=50), search_map_async(dest, limit=50))
+        case "/calculate":
+            start, dest = arg("s"), arg("d")
+            if start and dest:
+                await prefetch_route(
+                    Point(*map(float, start.split(","))),
+                    Point(*map(float, dest.split(","))),
+                    via=[Point(*map(float, v.split(","))) for v in args.get("v", [])]
+                )
+        case "/recalculate":
+            route_id, which, point = arg("id"), arg("t"), arg("p")
+            if route_id and which in ("start", "dest", "via") and point:
+                # malformed parameters raise here and are left to the view to answer with a 400
+                await prefetch_recalculate(
+                    route_id,
+                    which,
+                    Point(*map(float, point.split(","))),
+                    via_index=int(arg("i") or 0),
+                    insert=arg("insert") in ("1", "true")
+                )
+
+
+def _environ(scope: dict, body: bytes) -> dict:
+    """WSGI environ for an ASGI HTTP scope"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _run_view(environ: dict) -> tuple[int, list[tuple[str, str]], bytes]:
+    """Run the Flask app for one request on a worker thread"""
+    response = {}
+    written: list[bytes] = []
+
+    def start_response(status: str, headers: list[tuple[str, str]], exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = headers
+        return written.append
+
+    chunks = flask_app(environ, start_response)
+    try:
+        written.extend(chunks)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return response["status"], response["headers"], b"".join(written)
+
+
+async def _send(send, status: int, headers: list[tuple[str, str]], body: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _overloaded(path: str, e: admission.Overloaded) -> tuple[int, list[tuple[str, str]], bytes]:
+    """Same 503 the Flask app answers with when an upstream sheds a request"""
+    import json
+
+    body = [] if path == "/predictiveSearch" else {"error": str(e), "upstream": e.upstream}
+    return 503, [("Content-Type", "application/json"), ("Retry-After", "1")], json.dumps(body).encode("utf-8")
+
+
+async def app(scope: dict, receive, send) -> None:
+    """ASGI entry point serving every route of app.py
+
+    Requests that call Photon or ORS have those calls awaited on the event loop
+    first, so hundreds of them can be in flight without holding a thread each. The
+    Flask view then runs on one of WORKER_THREADS threads to render the response,
+    which keeps routes, templates and after-request hooks identical to the WSGI app.
+    Export generation and Vercel Blob uploads stay in the view.
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await outbound.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    path = scope["path"]
+    if scope["method"] == "GET":
+        admission.set_priority(admission.PRIORITY_AUTOCOMPLETE if path in AUTOCOMPLETE_PATHS else admission.PRIORITY_CALCULATE)
+        try:
+            await prefetch(path, parse_qs(scope["query_string"].decode("utf-8", "replace")))
+        except admission.Overloaded as e:
+            debug(f"Shed request: {e}")
+            await _send(send, *_overloaded(path, e))
+            return
+        except Exception as e:
+            # the view makes the same calls again and reports the error the usual way
+            debug(f"Prefetch for {path} failed: {e}")
+
+    loop = asyncio.get_running_loop()
+    await _send(send, *await loop.run_in_executor(WORKERS, _run_view, _environ(scope, body)))
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve leetRoute as an ASGI app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
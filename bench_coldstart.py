@@ -0,0 +1,94 @@
+"""Measure cold-start import time of the web app
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and
+reports the median wall time along with the slowest imports the module makes, e.g.
+
+    python bench_coldstart.py --runs 10 --output bench_output.txt
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+def import_once(module: str) -> tuple[float, dict[str, int]]:
+    """Import `module` in a fresh interpreter
+
+    Args:
+        module (str): module to import
+
+    Returns:
+        tuple[float, dict[str, int]]: wall time in ms, and cumulative import time in us of `module`
+            itself and of each import it makes directly
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr}")
+
+    # import time: self [us] | cumulative | imported package
+    # A module's line is printed once it has finished importing, after the lines of everything it
+    # imported, which are indented two more spaces. So the rows one level deep that come right
+    # before `module`'s top-level row are its direct imports.
+    cumulative = {}
+    children = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cum, name = line.split("|")
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        name = name.strip()
+        if depth == 1:
+            children[name] = int(cum)
+        elif depth == 0:
+            if name == module:
+                cumulative = {module: int(cum), **children}
+            children = {}
+    return wall_ms, cumulative
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app", help="module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument("--output", type=Path, help="append the report to this file")
+    args = parser.parse_args()
+
+    walls = []
+    slowest: dict[str, int] = {}
+    for _ in range(args.runs):
+        wall_ms, cumulative = import_once(args.module)
+        walls.append(wall_ms)
+        for name, us in cumulative.items():
+            slowest[name] = min(us, slowest.get(name, us))
+
+    baseline_ms, _ = import_once("sys")
+    report = [
+        f"cold start: import {args.module} ({args.runs} runs, {time.strftime('%Y-%m-%d %H:%M:%S')})",
+        f"  median {statistics.median(walls):.1f} ms, min {min(walls):.1f} ms, max {max(walls):.1f} ms",
+        f"  bare interpreter {baseline_ms:.1f} ms",
+        f"  import {args.module} {slowest.get(args.module, 0) / 1000:.1f} ms, of which its slowest direct imports (cumulative, best of runs):",
+    ]
+    children = {name: us for name, us in slowest.items() if name != args.module}
+    for name, us in sorted(children.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        report.append(f"    {us / 1000:8.1f} ms  {name}")
+
+    text = "\n".join(report)
+    print(text)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(text + "\n\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Load-test the sync (Flask/Werkzeug) and async (ASGI) serving modes against stubbed upstreams
+
+Starts a stub Photon + ORS server that answers after a fixed latency, runs the app
+in each mode pointed at it through a temporary config, and fires a mix of
+autocomplete and calculate requests at it with many in flight at once, e.g.
+
+    python bench_load.py --requests 2000 --concurrency 300 --latency-ms 200
+
+Exports are written locally into a temporary directory, so no Vercel Blob token is needed.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --- stub upstreams -------------------------------------------------------------------------
+
+def _feature(lat: float, lon: float, name: str) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": {
+            "name": name, "street": name, "housenumber": str(random.randint(1, 999)), "city": "Springfield",
+            "state": "Illinois", "countrycode": "US", "osm_key": "building", "osm_value": "house",
+        },
+    }
+
+
+def _route(coords: list[list[float]], vertices: int=200) -> dict:
+    """A straight-line ORS route through every coordinate, with one segment per leg as ORS answers"""
+    from polycodec import encode
+
+    line: list[tuple[float, float]] = []
+    segments, way_points, waytype = [], [0], []
+    for (lon0, lat0), (lon1, lat1) in zip(coords, coords[1:]):
+        first = len(line) - 1 if line else 0
+        leg = [(lat0 + (lat1 - lat0) * i / (vertices - 1), lon0 + (lon1 - lon0) * i / (vertices - 1)) for i in range(vertices)]
+        line.extend(leg[1:] if line else leg)
+        last = len(line) - 1
+        distance = math.dist((lat0, lon0), (lat1, lon1)) * 69
+        segments.append({
+            "distance": distance,
+            "duration": distance * 90,
+            "steps": [
+                {"distance": distance, "duration": distance * 90, "type": 11, "instruction": "Head north", "name": "Main Street", "way_points": [first, last]},
+                {"distance": 0, "duration": 0, "type": 10, "instruction": "Arrive at your destination", "name": "-", "way_points": [last, last]},
+            ],
+        })
+        way_points.append(last)
+        middle = (first + last) // 2
+        waytype += [[first, middle, 3], [middle, last, 2]]
+    lats, lons = [c[0] for c in line], [c[1] for c in line]
+    distance = sum(seg["distance"] for seg in segments)
+    last = len(line) - 1
+    return {
+        "summary": {"distance": distance, "duration": distance * 90},
+        "segments": segments,
+        "bbox": [min(lons), min(lats), max(lons), max(lats)],
+        "geometry": encode(line),
+        "way_points": way_points,
+        "extras": {
+            "waytype": {"values": waytype},
+            "surface": {"values": [[0, last, 3]]},
+            "steepness": {"values": [[0, last, 0]]},
+        },
+    }
+
+
+def stub_app(latency: float):
+    """ASGI app answering Photon search/reverse and ORS directions after `latency` seconds"""
+    from urllib.parse import parse_qs
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await asyncio.sleep(latency)
+
+        args = {k: v[0] for k, v in parse_qs(scope["query_string"].decode()).items()}
+        match scope["path"]:
+            case "/api/" | "/api":
+                lat, lon = random.uniform(39, 40), random.uniform(-90, -89)
+                data = {"type": "FeatureCollection", "features": [
+                    _feature(lat + i * 1e-3, lon, f"{args.get('q', '')} {i}") for i in range(min(int(args.get("limit", 15)), 10))
+                ]}
+            case "/reverse":
+                data = {"type": "FeatureCollection", "features": [_feature(float(args["lat"]), float(args["lon"]), "Reverse Street")]}
+            case path if path.startswith("/v2/directions/"):
+                request = json.loads(body)
+                route = _route(request["coordinates"])
+                data = {"bbox": route["bbox"], "routes": [route], "metadata": {"service": "routing"}}
+            case _:
+                await send({"type": "http.response.start", "status": 404, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+                return
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(data).encode()})
+
+    return app
+
+
+def serve_stub(port: int, latency: float) -> None:
+    import uvicorn
+
+    uvicorn.run(stub_app(latency), host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+# --- app servers ----------------------------------------------------------------------------
+
+def write_config(directory: Path, stub_url: str) -> Path:
+    """Copy config.json with upstreams pointed at the stub and admission limits out of the way"""
+    with open(ROOT / "config.json", "r") as f:
+        config = json.load(f)
+    config["debugging"] = {k: False for k in config.get("debugging", {})}
+    config.setdefault("photon", {})["base_url"] = stub_url
+    config.setdefault("routing", {}).update({"ors_base_url": stub_url, "use_blob": False})
+    # every request uses fresh coordinates, but make sure no route is reused either way
+    config.setdefault("similarity", {})["max_routes"] = 0
+    unlimited = {"rate": 1e6, "burst": 1e6, "max_queue": 100000, "timeout": 120}
+    config.setdefault("admission", {})["upstreams"] = {name: unlimited for name in ("photon", "ors", "blob")}
+    path = directory / "config.json"
+    with open(path, "w") as f:
+        json.dump(config, f, indent=4)
+    return path
+
+
+def start_server(mode: str, port: int, workdir: Path, config_path: Path) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LEETROUTE_CONFIG": str(config_path),
+        "ORS_KEY": "bench",
+        "PYTHONPATH": str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""),
+    }
+    if mode == "sync":
+        cmd = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--with-threads", "--no-reload", "--no-debugger"]
+    else:
+        cmd = [sys.executable, str(ROOT / "asgi.py"), "--port", str(port)]
+    return subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_port(port: int, timeout: float=30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing is listening on port {port}")
+
+
+def thread_count(pid: int) -> int | None:
+    """Threads in a process, read from /proc where available"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+# --- load generator -------------------------------------------------------------------------
+
+def _request_path(kind: str) -> str:
+    lat, lon = random.uniform(39, 40), random.uniform(-90, -89)
+    if kind == "autocomplete":
+        return f"/predictiveSearch?q=street{random.randrange(10 ** 9)}"
+    return f"/calculate?s={lon:.6f},{lat:.6f}&d={lon + random.uniform(-0.2, 0.2):.6f},{lat + random.uniform(-0.2, 0.2):.6f}"
+
+
+async def run_load(base_url: str, pid: int, requests: int, concurrency: int, calculate_share: float) -> dict:
+    """Send `requests` requests with `concurrency` in flight at a time
+
+    Returns:
+        dict: wall time, peak server threads, and per-kind latencies (s) and error counts
+    """
+    import aiohttp
+
+    kinds = ["calculate" if random.random() < calculate_share else "autocomplete" for _ in range(requests)]
+    latencies: dict[str, list[float]] = {"autocomplete": [], "calculate": []}
+    errors: dict[str, int] = {"autocomplete": 0, "calculate": 0}
+    peak_threads = 0
+    queue = iter(kinds)
+    done = asyncio.Event()
+
+    async def watch_threads() -> None:
+        nonlocal peak_threads
+        while not done.is_set():
+            peak_threads = max(peak_threads, thread_count(pid) or 0)
+            await asyncio.sleep(0.05)
+
+    async def worker(session: "aiohttp.ClientSession") -> None:
+        for kind in queue:
+            t0 = time.perf_counter()
+            try:
+                async with session.get(base_url + _request_path(kind)) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            latencies[kind].append(time.perf_counter() - t0)
+            errors[kind] += not ok
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        watcher = asyncio.create_task(watch_threads())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+        done.set()
+        await watcher
+    return {"wall": wall, "peak_threads": peak_threads, "latencies": latencies, "errors": errors}
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else math.nan
+
+
+def report_lines(mode: str, result: dict, requests: int) -> list[str]:
+    lines = [
+        f"  {mode}: {requests / result['wall']:.1f} req/s over {result['wall']:.1f} s, peak {result['peak_threads'] or '?'} server threads"
+    ]
+    for kind, values in result["latencies"].items():
+        if not values:
+            continue
+        lines.append(
+            f"    {kind:<12} n={len(values):<5} errors={result['errors'][kind]:<4} "
+            f"p50 {_percentile(values, 50) * 1000:7.0f} ms  p95 {_percentile(values, 95) * 1000:7.0f} ms  "
+            f"p99 {_percentile(values, 99) * 1000:7.0f} ms  mean {statistics.fmean(values) * 1000:7.0f} ms"
+        )
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("sync", "async", "both"), default="both", help="serving mode(s) to test (default: both)")
+    parser.add_argument("--requests", type=int, default=1000, help="total requests per mode")
+    parser.add_argument("--concurrency", type=int, default=200, help="requests in flight at once")
+    parser.add_argument("--calculate-share", type=float, default=0.2, help="fraction of requests that are /calculate")
+    parser.add_argument("--latency-ms", type=float, default=200, help="stubbed upstream response time")
+    parser.add_argument("--output", type=Path, help="append the report to this file")
+    parser.add_argument("--stub", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stub:
+        serve_stub(args.stub, args.latency_ms / 1000)
+        return
+
+    modes = ("sync", "async") if args.mode == "both" else (args.mode,)
+    report = [
+        f"load test: {args.requests} requests, {args.concurrency} in flight, {args.calculate_share:.0%} calculate, "
+        f"upstream latency {args.latency_ms:.0f} ms ({time.strftime('%Y-%m-%d %H:%M:%S')})"
+    ]
+    with tempfile.TemporaryDirectory(prefix="leetroute-bench-") as tmp:
+        workdir = Path(tmp)
+        stub_port = free_port()
+        stub = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--stub", str(stub_port), "--latency-ms", str(args.latency_ms)],
+            cwd=ROOT,
+        )
+        try:
+            wait_for_port(stub_port)
+            config_path = write_config(workdir, f"http://127.0.0.1:{stub_port}")
+            for mode in modes:
+                port = free_port()
+                server = start_server(mode, port, workdir, config_path)
+                try:
+                    wait_for_port(port)
+                    result = asyncio.run(run_load(f"http://127.0.0.1:{port}", server.pid, args.requests, args.concurrency, args.calculate_share))
+                finally:
+                    server.terminate()
+                    server.wait()
+                lines = report_lines(mode, result, args.requests)
+                print("\n".join(lines), flush=True)
+                report.extend(lines)
+        finally:
+            stub.terminate()
+            stub.wait()
+
+    text = "\n".join(report)
+    print(text)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(text + "\n\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from metrics import record_cache
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache that reports hits and misses to /metrics
+
+    `on_evict`, if given, is called with each key and value pushed out by `put`,
+    after the lock is released.
+    """
+
+    def __init__(self, name: str, maxsize: int, on_evict: Callable[[Hashable, Any], None] | None=None) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any=None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                record_cache(self.name, True)
+                return self._data[key]
+        record_cache(self.name, False)
+        return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        evicted = []
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+        if self.on_evict is not None:
+            for item in evicted:
+                self.on_evict(*item)
+
+    def pop(self, key: Hashable, default: Any=None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def values(self) -> list[Any]:
+        """Snapshot of the cached values, without touching their recency"""
+        with self._lock:
+            return list(self._data.values())
@@ -0,0 +1,56 @@
+from typing import *
+import inquirer
+from LocationSearch import search_map, format_results, Location
+
+
+def prompt_results(results: dict[str, Any]) -> Any:
+    question_dicts, locations = format_results(results)
+
+    # Convert each question dict into inquirer question objects (load_from_dict expects one question dict)
+    question_objs: list[Any] = []
+    for qd in question_dicts:
+        loaded = inquirer.load_from_dict(qd)
+        # load_from_dict may return a list or a single question object depending on version; handle both.
+        if isinstance(loaded, list):
+            question_objs.extend(loaded)
+        else:
+            question_objs.append(loaded)
+
+    # Now prompt the user
+    answers = inquirer.prompt(question_objs)
+    if not answers:
+        print("No answer (possibly user aborted).")
+        return None
+
+    # answers['destination'] will be the index (because we used (label, index) pairs)
+    idx = answers.get("destination")
+    if idx is None:
+        print("No destination chosen.")
+        return None
+
+    # map back to Location
+    try:
+        chosen_location = locations[int(idx)]
+    except (IndexError, ValueError, TypeError):
+        print("Invalid selection returned by inquirer:", idx)
+        return None
+
+    print("You chose:", chosen_location.displayname)   # uses __repr__ -> displayname
+    print("Plain name:", chosen_location.name)
+    print("Coords:", chosen_location.coords)
+    return chosen_location
+
+
+def prompt_search(query: str, priority_pos: Optional[tuple[float, float]] = None, limit: int = 15) -> Location | None:
+    res = search_map(query=query, priority_pos=priority_pos, limit=limit)
+    # with open("res.json", "w", encoding="utf-8") as f:
+    #     json.dump(res, f, indent=4)
+    loc = prompt_results(res)
+    return loc
+
+
+# if __name__ == "__main__":
+#     res = search_map("490 Tanglewood Drive Middleville", limit=100)
+#     with open("res.json", "w", encoding="utf-8") as f:
+#         json.dump(res, f, indent=4)
+#     prompt_results(res)
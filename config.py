@@ -0,0 +1,20 @@
+import json
+from os import getenv
+from pathlib import Path
+
+
+# LEETROUTE_CONFIG points at an alternative config file, e.g. for bench_load.py's stubbed upstreams
+CONFIG_PATH = Path(getenv("LEETROUTE_CONFIG") or Path(__file__).with_name("config.json"))
+
+with open(CONFIG_PATH, "r") as f:
+    CONFIG = json.load(f)
+__VERSION_ROOT = CONFIG.get("version")
+__DEBUGGING_ROOT = CONFIG.get("debugging")
+
+LEETROUTE_VERSION = __VERSION_ROOT.get("base")
+ENGINE_VERSION = __VERSION_ROOT.get("engine")
+WEBAPP_VERSION = __VERSION_ROOT.get("webapp")
+
+ENGINE_DEBUGGING = __DEBUGGING_ROOT.get("engine")
+LOCSEARCH_DEBUGGING = __DEBUGGING_ROOT.get("LocationSearch")
+WEBAPP_DEBUGGING = __DEBUGGING_ROOT.get("webapp")
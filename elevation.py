@@ -0,0 +1,203 @@
+import math
+import dataclasses
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+from config import CONFIG
+from geometry import RouteIndex
+from metrics import record_cache, timed
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is imported inside the sampling functions; routes are only profiled when a DEM directory exists
+
+
+__ELEVATION_ROOT = CONFIG.get("elevation", {})
+
+DEM_DIR = Path(__ELEVATION_ROOT.get("dem_dir", "./dem"))
+MAX_OPEN_TILES = __ELEVATION_ROOT.get("max_open_tiles", 8)
+SAMPLE_SPACING_M = __ELEVATION_ROOT.get("sample_spacing_m", 30)
+GRADE_WINDOW_M = __ELEVATION_ROOT.get("grade_window_m", 100)
+
+HGT_VOID = -32768
+
+
+@dataclasses.dataclass
+class ElevationProfile:
+    vertex_elevations: "np.ndarray"
+    min_elevation: float
+    max_elevation: float
+    ascent: float
+    descent: float
+    max_grade: float
+
+    def summary(self) -> dict:
+        return {
+            "min_elevation_m": round(self.min_elevation, 1),
+            "max_elevation_m": round(self.max_elevation, 1),
+            "ascent_m": round(self.ascent, 1),
+            "descent_m": round(self.descent, 1),
+            "max_grade_pct": round(self.max_grade, 1),
+        }
+
+
+def tile_name(lat: int, lon: int) -> str:
+    """SRTM file name for the 1x1 degree tile whose south-west corner is (lat, lon), e.g. N42W086.hgt"""
+    ns = "N" if lat >= 0 else "S"
+    ew = "E" if lon >= 0 else "W"
+    return f"{ns}{abs(lat):02d}{ew}{abs(lon):03d}.hgt"
+
+
+class TileCache:
+    """LRU cache of memory-mapped SRTM .hgt tiles
+
+    Tiles are mapped read-only, so only the pages a route actually touches are read
+    from disk. At most `max_open` tiles stay mapped; the least recently used one is
+    dropped when another is needed. Missing tiles are remembered as None.
+    """
+
+    def __init__(self, dem_dir: Path = DEM_DIR, max_open: int = MAX_OPEN_TILES) -> None:
+        self.dem_dir = dem_dir
+        self.max_open = max_open
+        self._tiles: OrderedDict[tuple[int, int], "np.ndarray | None"] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, lat: int, lon: int) -> "np.ndarray | None":
+        """Get the tile with south-west corner (lat, lon) as a square int16 grid, or None if there is no file for it"""
+        import numpy as np
+
+        key = (lat, lon)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                record_cache("dem_tiles", True)
+                return self._tiles[key]
+            record_cache("dem_tiles", False)
+
+            path = self.dem_dir / tile_name(lat, lon)
+            tile = None
+            if path.exists():
+                side = math.isqrt(path.stat().st_size // 2)
+                tile = np.memmap(path, dtype=">i2", mode="r", shape=(side, side))
+            self._tiles[key] = tile
+            if len(self._tiles) > self.max_open:
+                self._tiles.popitem(last=False)
+            return tile
+
+
+TILES = TileCache()
+
+
+def available() -> bool:
+    """Whether a DEM directory is configured and present"""
+    return DEM_DIR.is_dir()
+
+
+def sample_elevations(lats: "np.ndarray", lons: "np.ndarray", tiles: TileCache | None = None) -> "np.ndarray":
+    """Bilinearly interpolate DEM heights for many points at once
+
+    Points are grouped by tile and each group is interpolated with array operations.
+    Points on missing tiles or next to void cells come back as NaN.
+
+    Args:
+        lats (np.ndarray): latitudes in degrees
+        lons (np.ndarray): longitudes in degrees
+        tiles (TileCache | None, optional): tile source. Defaults to the shared cache.
+
+    Returns:
+        np.ndarray: elevations in metres
+    """
+    import numpy as np
+
+    tiles = tiles or TILES
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    out = np.full(lats.shape, np.nan)
+    tile_lat = np.floor(lats).astype(np.int64)
+    tile_lon = np.floor(lons).astype(np.int64)
+    keys, inverse = np.unique(np.stack([tile_lat, tile_lon], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    for k, (t_lat, t_lon) in enumerate(keys):
+        tile = tiles.get(int(t_lat), int(t_lon))
+        if tile is None:
+            continue
+        sel = np.nonzero(inverse == k)[0]
+        side = tile.shape[0]
+        # rows run north to south, columns west to east
+        row = (t_lat + 1 - lats[sel]) * (side - 1)
+        col = (lons[sel] - t_lon) * (side - 1)
+        r0 = np.clip(np.floor(row).astype(np.int64), 0, side - 2)
+        c0 = np.clip(np.floor(col).astype(np.int64), 0, side - 2)
+        fr = row - r0
+        fc = col - c0
+
+        q00 = tile[r0, c0].astype(np.float64)
+        q01 = tile[r0, c0 + 1].astype(np.float64)
+        q10 = tile[r0 + 1, c0].astype(np.float64)
+        q11 = tile[r0 + 1, c0 + 1].astype(np.float64)
+        heights = (q00 * (1 - fr) * (1 - fc) + q01 * (1 - fr) * fc + q10 * fr * (1 - fc) + q11 * fr * fc)
+        void = (q00 == HGT_VOID) | (q01 == HGT_VOID) | (q10 == HGT_VOID) | (q11 == HGT_VOID)
+        heights[void] = np.nan
+        out[sel] = heights
+    return out
+
+
+@timed("elevation.profile")
+def profile_route(index: RouteIndex, spacing: float = SAMPLE_SPACING_M, grade_window: float = GRADE_WINDOW_M) -> ElevationProfile | None:
+    """Sample a route against the local DEM
+
+    Vertex elevations are kept for the GPX export. Climb and grade are measured on
+    samples spaced `spacing` metres apart along the route so that dense vertices in
+    corners don't inflate them, and grade is taken over `grade_window` metres to
+    smooth out DEM noise.
+
+    Args:
+        index (RouteIndex): geometry index of the route
+        spacing (float, optional): distance between profile samples in metres. Defaults to SAMPLE_SPACING_M.
+        grade_window (float, optional): distance over which grade is measured in metres. Defaults to GRADE_WINDOW_M.
+
+    Returns:
+        ElevationProfile | None: None if no DEM is available or the route isn't covered by it
+    """
+    if not available() or len(index) < 2:
+        return None
+    import numpy as np
+
+    # zero-copy views over the index arrays
+    lats = np.frombuffer(index.lats, dtype=np.float64)
+    lons = np.frombuffer(index.lons, dtype=np.float64)
+    cumdist = np.frombuffer(index.cumdist, dtype=np.float64)
+
+    vertex_ele = sample_elevations(lats, lons)
+    if np.all(np.isnan(vertex_ele)):
+        return None
+
+    dist = np.append(np.arange(0, cumdist[-1], spacing), cumdist[-1])
+    ele = sample_elevations(np.interp(dist, cumdist, lats), np.interp(dist, cumdist, lons))
+    known = ~np.isnan(ele)
+    if known.any():
+        ele = np.interp(dist, dist[known], ele[known])
+    else:
+        # every sample landed on a void or a missing tile; resample the vertices that have an elevation instead
+        known = ~np.isnan(vertex_ele)
+        ele = np.interp(dist, cumdist[known], vertex_ele[known])
+
+    climb = np.diff(ele)
+    window = max(1, int(round(grade_window / spacing)))
+    if len(ele) > window:
+        grades = (ele[window:] - ele[:-window]) / (dist[window:] - dist[:-window]) * 100
+        max_grade = float(np.max(np.abs(grades)))
+    else:
+        max_grade = float(abs(ele[-1] - ele[0]) / cumdist[-1] * 100) if cumdist[-1] else 0.0
+
+    return ElevationProfile(
+        vertex_elevations=vertex_ele,
+        min_elevation=float(np.min(ele)),
+        max_elevation=float(np.max(ele)),
+        ascent=float(climb[climb > 0].sum()),
+        descent=float(abs(climb[climb < 0].sum())),
+        max_grade=max_grade,
+    )
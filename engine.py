@@ -1,93 +1,53 @@
-# from LocationSearch import prompt_search, Location, Point
-from LocationSearch import reverse_geocode
-import openrouteservice
-from openrouteservice.directions import directions as ors_directions
+# from cli import prompt_search
+from LocationSearch import Location, reverse_geocode, reverse_geocode_async
+from config import CONFIG, LEETROUTE_VERSION, ENGINE_VERSION, WEBAPP_VERSION, ENGINE_DEBUGGING
 from dotenv import load_dotenv
 from os import getenv
 import json
-import polyline
-import simplekml
 import dataclasses
 from pathlib import Path
-from typing import Self, Literal
+from typing import Self, Literal, Sequence
 import math
-from enum import Enum
-import vercel_blob as blob
-
-
-with open("config.json", "r") as f:
-    CONFIG = json.load(f)
-__VERSION_ROOT = CONFIG.get("version")
-__DEBUGGING_ROOT = CONFIG.get("debugging")
-
-LEETROUTE_VERSION = __VERSION_ROOT.get("base")
-ENGINE_VERSION = __VERSION_ROOT.get("engine")
-WEBAPP_VERSION = __VERSION_ROOT.get("webapp")
-
-ENGINE_DEBUGGING = __DEBUGGING_ROOT.get("engine")
-LOCSEARCH_DEBUGGING = __DEBUGGING_ROOT.get("LocationSearch")
-WEBAPP_DEBUGGING = __DEBUGGING_ROOT.get("webapp")
+from functools import cache, cached_property
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from metrics import span, timed
+from cache import LRUCache
+from admission import UPSTREAMS
+import similarity
+from geometry import RouteIndex
+from geodesy import Point
+from segmentation import segment_route
+import elevation
+from polycodec import Polyline, decode as decode_polyline, encode as encode_polyline
+from overlay import route_version
+from roadinfo import EXTRA_INFO, RunLengthArray, parse_extras, summarise_extras
+
+# openrouteservice, simplekml and vercel_blob are imported where they are first
+# used so that importing the engine stays cheap on a serverless cold start
+
+
+__ROUTING_ROOT = CONFIG.get("routing", {})
+LEG_CACHE_SIZE = __ROUTING_ROOT.get("leg_cache_size", 256)
+MAX_SESSIONS = __ROUTING_ROOT.get("max_sessions", 128)
+MAX_PARALLEL_REQUESTS = __ROUTING_ROOT.get("max_parallel_requests", 4)
+# ORS directions accepts up to 50 waypoints per request on the public API
+MAX_STOPS_PER_REQUEST = max(2, __ROUTING_ROOT.get("max_stops_per_request", 50))
+ORS_URL = __ROUTING_ROOT.get("ors_base_url", "https://api.openrouteservice.org").rstrip("/")
+USE_BLOB = __ROUTING_ROOT.get("use_blob", True)
 
 
 load_dotenv()
 ORS_KEY = getenv("ORS_KEY")
 BLOB_READ_WRITE_TOKEN = getenv("BLOB_READ_WRITE_TOKEN")
-ors = openrouteservice.Client(key=ORS_KEY)
-
-class DistanceUnit(Enum):
-    MILES = "miles"
-    KILOMETERS = "kilometers"
-
-@dataclasses.dataclass
-class Point:
-    lat: float | int=0
-    lon: float | int=0
-    
-    def rad(self) -> Self:
-        return Point(math.radians(self.lat), math.radians(self.lon))
-
-    def distance(self, other: Self, unit: DistanceUnit) -> float:
-        R = 3959 if unit == "miles" else 6357
-
-        dlat = self.rad().lat - other.rad().lat
-        dlon = self.rad().lon - other.rad().lon
-        h = 2 * math.asin( math.sqrt( (math.sin(dlat / 2)**2) + math.cos(self.rad().lat) * math.cos(other.rad().lat) * (math.sin(dlon / 2)**2) ) )
-        d = h * R
-
-        return d
-    
-    def bearing(self, other: Self) -> float:
-        p1 = self.rad()
-        p2 = other.rad()
-        dlon = p2.lon - p1.lon
-        x = math.sin(dlon) * math.cos(p2.lat)
-        y = math.cos(p1.lat) * math.sin(p2.lat) - math.sin(p1.lat) * math.cos(p2.lat) * math.cos(dlon)
-        bearing = math.atan2(x, y)
-        return math.degrees(bearing)
-    
-    @classmethod
-    def from_tuple(cls, data: tuple[float,float]) -> Self:
-        return cls(*data)
-    
-    def to_tuple(self, swap: bool=False) -> tuple[float,float]:
-        return (self.lon, self.lat) if swap else (self.lat, self.lon)
 
-    def __repr__(self) -> str:
-        return f"Point({self.lat}, {self.lon})"
 
-
-
-@dataclasses.dataclass
-class Location:
-    coords: Point
-    displayname: str=''
-    name: str=''
-
-    def __repr__(self) -> str:
-        return self.displayname
-
-    def __str__(self) -> str:
-        return self.name
+@cache
+def ors_client():
+    """Build the Openroute Service client on first use"""
+    import openrouteservice
+    return openrouteservice.Client(key=ORS_KEY, base_url=ORS_URL)
 
 
 @dataclasses.dataclass
@@ -130,8 +90,10 @@ class Route:
     segments: list[Segment]
     bbox: list[float]
     geometry: str
-    polyline: list[tuple[float,float]]
+    polyline: Polyline
     way_points: list[int]
+    extras: dict[str, RunLengthArray] = dataclasses.field(default_factory=dict)
+    warnings: list[dict] | None=None
 
     @classmethod
     def from_dict(cls, data: dict) -> Self:
@@ -146,9 +108,16 @@ class Route:
                 for dseg in v:
                     segments.append(Segment.from_dict(dseg))
                 v = segments
+            elif k == "extras":
+                v = parse_extras(v)
             conv_data[k] = v
         return cls(**conv_data)
 
+    @cached_property
+    def geometry_index(self) -> RouteIndex:
+        """Cumulative-distance index over the polyline, built on first access"""
+        return RouteIndex(self.polyline)
+
 
 @dataclasses.dataclass
 class Directions:
@@ -189,7 +158,7 @@ def alt_routes(share_factor: float=0.8, target_count: int=2, weight_factor: int=
     }
 
 
-def get_directions(start: Location, dest: Location, debug: bool=False, units: Literal["m", "km", "mi"]="mi", alternative_routes: dict[str,float|int] | None = None) -> Directions:
+def get_directions(start: Location, dest: Location, debug: bool=False, units: Literal["m", "km", "mi"]="mi", alternative_routes: dict[str,float|int] | None = None, extra_info: Sequence[str] | None=EXTRA_INFO, via: Sequence[Location]=()) -> Directions:
     """
     Get directions from Openroute Service
 
@@ -198,43 +167,74 @@ def get_directions(start: Location, dest: Location, debug: bool=False, units: Li
         dest (Location): Destination location
         debug (bool, optional): Save response from the API to a file. Defaults to False.
         units (Literal[&quot;m&quot;, &quot;km&quot;, &quot;mi&quot;], optional): Units to get response in. Defaults to "mi".
+        extra_info (Sequence[str] | None, optional): ORS extra_info types to request, stored on each route as run-length arrays. Defaults to EXTRA_INFO.
+        via (Sequence[Location], optional): stops to pass through in order, answered in the same request with one segment per leg. Defaults to ().
 
     Returns:
         Directions
     """
     
     
-    coords = (start.coords.to_tuple(), dest.coords.to_tuple())
-    directions = ors_directions(
-        client=ors,
-        coordinates=coords,
-        alternative_routes=alternative_routes,
-        units=units
-        )
-    
+    from openrouteservice.directions import directions as ors_directions
+
+    coords = tuple(stop.coords.to_tuple() for stop in (start, *via, dest))
+    with span("ors.directions"):
+        directions = UPSTREAMS["ors"].call(
+            ors_directions,
+            client=ors_client(),
+            coordinates=coords,
+            alternative_routes=alternative_routes,
+            units=units,
+            extra_info=list(extra_info) if extra_info else None
+            )
+    return _parse_directions(directions, debug)
+
+
+async def get_directions_async(start: Location, dest: Location, units: Literal["m", "km", "mi"]="mi", alternative_routes: dict[str,float|int] | None = None, extra_info: Sequence[str] | None=EXTRA_INFO, via: Sequence[Location]=()) -> Directions:
+    """`get_directions` for the ASGI serving mode, posting to ORS without blocking the event loop
+
+    Sends the same request body the openrouteservice client builds for `get_directions`.
+    """
+    import outbound
+
+    body: dict = {"coordinates": [stop.coords.to_tuple() for stop in (start, *via, dest)], "units": units}
+    if alternative_routes:
+        body["alternative_routes"] = alternative_routes
+    if extra_info:
+        body["extra_info"] = list(extra_info)
+    with span("ors.directions"):
+        directions = await UPSTREAMS["ors"].call_async(
+            outbound.post_json,
+            f"{ORS_URL}/v2/directions/driving-car/json",
+            body,
+            headers={"Authorization": ORS_KEY or ""}
+            )
+    return _parse_directions(directions)
+
+
+def _parse_directions(directions: dict, debug: bool=False) -> Directions:
     for i in range(len(directions["routes"])):
         pl_str = directions["routes"][i]["geometry"]
-        pl_coords = polyline.decode(pl_str)
+        with span("polyline.decode"):
+            pl_coords = decode_polyline(pl_str)
         directions["routes"][i]["polyline"] = pl_coords
         # pl_coords = [Point(*c) for c in pl_coords]
         # directions["routes"][i]["polyline"] = pl_coords
 
     if debug:
         with open("directions.json","w", encoding="utf-8") as f:
-            json.dump(directions, f, indent=4)
+            json.dump(directions, f, indent=4, default=list)
     
     return Directions.from_dict(directions)
 
+@timed("analyse_curvature")
 def analyse_curvature(route: Route) -> dict:
-    coords = [Point(*c) for c in route.polyline]
+    bearings = route.geometry_index.bearings
     turns = []
-    for i in range(1, len(coords) - 1):
-        b1 = coords[i-1].bearing(coords[i])
-        b2 = coords[i].bearing(coords[i+1])
+    for b1, b2 in zip(bearings, bearings[1:]):
         theta = abs(b2 - b1)
         if theta > 180:
             theta = 360 - theta
-
         turns.append(theta)
     
     return {
@@ -245,18 +245,265 @@ def analyse_curvature(route: Route) -> dict:
     }
 
 
+LEG_CACHE = LRUCache("directions_legs", LEG_CACHE_SIZE)
+
+
+def leg_key(start: Location, dest: Location) -> tuple[float, float, float, float]:
+    """Cache key for the leg between two stops, rounded to ~1 m"""
+    return (*(round(c, 5) for c in start.coords.to_tuple()), *(round(c, 5) for c in dest.coords.to_tuple()))
+
+
+def split_route(route: Route) -> list[Route]:
+    """Split a multi-stop ORS route into one Route per leg
+
+    The inverse of `stitch_routes`: ORS answers a request with several stops as one
+    route with a segment per leg, way-points at every stop, and step and extras
+    indices into the whole polyline. Each leg gets its own slice of the polyline
+    with those indices shifted to start at 0.
+
+    Args:
+        route (Route): route through n stops, with n way-points and n - 1 segments
+
+    Returns:
+        list[Route]: the n - 1 legs in travel order
+    """
+    if len(route.way_points) <= 2:
+        return [route]
+
+    legs = []
+    for seg, start, end in zip(route.segments, route.way_points, route.way_points[1:]):
+        coords = route.polyline[start:end + 1]
+        steps = [dataclasses.replace(st, way_points=[w - start for w in st.way_points]) for st in seg.steps]
+        lats, lons = coords.lats(), coords.lons()
+        legs.append(Route(
+            summary={"distance": seg.distance, "duration": seg.duration},
+            segments=[dataclasses.replace(seg, steps=steps)],
+            bbox=[min(lons), min(lats), max(lons), max(lats)],
+            geometry=encode_polyline(coords),
+            polyline=coords,
+            way_points=[0, end - start],
+            extras={name: runs.slice(start, end) for name, runs in route.extras.items()},
+        ))
+    return legs
+
+
+def fetch_legs(stops: list[Location]) -> list[Route]:
+    """Route through `stops` in one ORS request and cache each leg of the answer
+
+    Args:
+        stops (list[Location]): at most MAX_STOPS_PER_REQUEST stops
+
+    Returns:
+        list[Route]: one leg per consecutive pair of stops
+    """
+    route = get_directions(stops[0], stops[-1], via=stops[1:-1]).routes[0]
+    legs = split_route(route)
+    for a, b, leg in zip(stops, stops[1:], legs):
+        LEG_CACHE.put(leg_key(a, b), leg)
+    return legs
+
+
+async def fetch_legs_async(stops: list[Location]) -> list[Route]:
+    """`fetch_legs` for the ASGI serving mode; shares the leg cache"""
+    route = (await get_directions_async(stops[0], stops[-1], via=stops[1:-1])).routes[0]
+    legs = split_route(route)
+    for a, b, leg in zip(stops, stops[1:], legs):
+        LEG_CACHE.put(leg_key(a, b), leg)
+    return legs
+
+
+def get_leg(start: Location, dest: Location) -> Route:
+    """Get the fastest route between two stops, reusing a cached leg if there is one
+
+    Args:
+        start (Location): Starting location
+        dest (Location): Destination location
+
+    Returns:
+        Route
+    """
+    leg = LEG_CACHE.get(leg_key(start, dest))
+    return leg if leg is not None else fetch_legs([start, dest])[0]
+
+
+def missing_chunks(legs: Sequence[Route | None], max_stops: int=MAX_STOPS_PER_REQUEST) -> list[tuple[int, int]]:
+    """Group the legs still to fetch into ranges that can each be one ORS request
+
+    Every run of consecutive missing legs is split into as few chunks of at most
+    `max_stops` stops (`max_stops - 1` legs) as possible, with sizes differing by at most one.
+
+    Args:
+        legs (Sequence[Route | None]): known legs, None where a leg is missing
+        max_stops (int, optional): most stops per request. Defaults to MAX_STOPS_PER_REQUEST.
+
+    Returns:
+        list[tuple[int, int]]: (first, end) leg index ranges; the chunk's stops are `stops[first:end + 1]`
+    """
+    max_legs = max(1, max_stops - 1)
+    chunks = []
+    i = 0
+    while i < len(legs):
+        if legs[i] is not None:
+            i += 1
+            continue
+        end = i
+        while end < len(legs) and legs[end] is None:
+            end += 1
+        count = -(-(end - i) // max_legs)
+        size, extra = divmod(end - i, count)
+        for k in range(count):
+            first = i
+            i += size + (k < extra)
+            chunks.append((first, i))
+    return chunks
+
+
+def get_legs(stops: list[Location], previous_legs: dict | None=None) -> list[Route]:
+    """Get the legs between consecutive stops, fetching the missing ones in few requests
+
+    Legs are looked up in `previous_legs` and then the leg cache. The missing ones are
+    grouped into runs of up to MAX_STOPS_PER_REQUEST stops, each fetched as one
+    multi-stop ORS request and split back into legs, with the requests spread over a
+    pool of at most MAX_PARALLEL_REQUESTS threads. A route with dozens of stops
+    therefore costs one or two requests against the ORS rate limit, not one per leg.
+
+    Args:
+        stops (list[Location]): start, any via-points, and destination
+        previous_legs (dict | None, optional): known legs keyed by `leg_key`. Defaults to None.
+
+    Returns:
+        list[Route]: one leg per consecutive pair of stops
+    """
+    previous_legs = previous_legs or {}
+    legs: list[Route | None] = []
+    for a, b in zip(stops, stops[1:]):
+        key = leg_key(a, b)
+        leg = previous_legs.get(key)
+        legs.append(leg if leg is not None else LEG_CACHE.get(key))
+
+    chunks = missing_chunks(legs)
+    if len(chunks) == 1:
+        fetched = [fetch_legs(stops[first:end + 1]) for first, end in chunks]
+    elif chunks:
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(chunks))) as pool:
+            # copy_context keeps per-request timing spans recorded from the pool threads
+            futures = [pool.submit(copy_context().run, fetch_legs, stops[first:end + 1]) for first, end in chunks]
+            fetched = [future.result() for future in futures]
+    else:
+        fetched = []
+    for (first, end), part in zip(chunks, fetched):
+        legs[first:end] = part
+    return legs
+
+
+async def get_leg_async(start: Location, dest: Location) -> Route:
+    """`get_leg` for the ASGI serving mode; shares the leg cache"""
+    leg = LEG_CACHE.get(leg_key(start, dest))
+    return leg if leg is not None else (await fetch_legs_async([start, dest]))[0]
+
+
+@timed("stitch_routes")
+def stitch_routes(legs: list[Route]) -> Route:
+    """Join consecutive legs into one Route
+
+    The shared vertex at each junction is kept once, and every way-point index
+    (route, segment steps and extras runs) is shifted by its leg's offset into the
+    joined polyline. Each leg stays one Segment, as ORS does for multi-stop routes.
+
+    Args:
+        legs (list[Route]): legs in travel order, each starting where the previous one ends
+
+    Returns:
+        Route
+    """
+    if len(legs) == 1:
+        return legs[0]
+
+    coords = Polyline()
+    segments: list[Segment] = []
+    way_points: list[int] = []
+    extras_parts: dict[str, list[tuple[RunLengthArray, int]]] = {}
+    summary = {"distance": 0.0, "duration": 0.0}
+    for leg in legs:
+        offset = max(len(coords) - 1, 0)
+        coords.extend(leg.polyline if not coords else leg.polyline[1:])
+        for seg in leg.segments:
+            steps = [dataclasses.replace(st, way_points=[w + offset for w in st.way_points]) for st in seg.steps]
+            segments.append(dataclasses.replace(seg, steps=steps))
+        way_points.extend(w + offset for w in (leg.way_points if not way_points else leg.way_points[1:]))
+        for name, runs in leg.extras.items():
+            extras_parts.setdefault(name, []).append((runs, offset))
+        for k in summary:
+            summary[k] += leg.summary.get(k, 0)
+
+    lons = [b for leg in legs for b in leg.bbox[0::2]]
+    lats = [b for leg in legs for b in leg.bbox[1::2]]
+    return Route(
+        summary=summary,
+        segments=segments,
+        bbox=[min(lons), min(lats), max(lons), max(lats)] if lons else [],
+        geometry=encode_polyline(coords),
+        polyline=coords,
+        way_points=way_points,
+        extras={name: RunLengthArray.concat(parts) for name, parts in extras_parts.items()},
+    )
+
+
 # start = Location(coords=Point(-85.4586982792198, 42.71960583782718),displayname="Home",name="Home")
 # dest = Location(coords=Point(-85.66661925485876, 42.96804797355541), displayname="GRCC Parking Ramp A",name="GRCC Parking Ramp A")
 # directions = get_directions(start, dest)
 # curvature = analyse_curvature(directions.routes[0])
 
-def generate_kml(start: Location, dest: Location, route: Route, output_path: Path, use_blob: bool=False) -> None:
+EXPORT_DIR = Path("./exports")
+EXPORT_FORMATS = ("KML", "GPX", "JSON")
+
+
+def upload_blob(path: Path, data: str) -> str:
+    """Upload an export to Vercel Blob storage
+
+    Args:
+        path (Path): pathname to store the blob under
+        data (str): file contents
+
+    Returns:
+        str: download URL of the stored blob
+    """
+    import vercel_blob as blob
+
+    with span("blob.upload"):
+        resp = UPSTREAMS["blob"].call(blob.put, str(path), bytes(data, encoding="utf-8"), verbose=True, options={"allowOverwrite": "true"})
+    return resp.get("downloadUrl")
+
+
+def delete_export(ref: str) -> None:
+    """Remove one export, given the link `export_route` returned for it
+
+    Args:
+        ref (str): a Vercel Blob download URL, or a local "/exports/..." path
+    """
+    try:
+        if ref.startswith(("http://", "https://")):
+            import vercel_blob as blob
+
+            with span("blob.delete"):
+                UPSTREAMS["blob"].call(blob.delete, ref.split("?")[0])
+        else:
+            (EXPORT_DIR / Path(ref).name).unlink(missing_ok=True)
+    except Exception as e:
+        # a leftover export only costs storage, so never fail the request over it
+        debug(f"could not delete export {ref}: {e}")
+
+
+@timed("export.kml")
+def generate_kml(start: Location, dest: Location, route: Route, output_path: Path, use_blob: bool=False, route_name: str | None=None) -> None:
+    import simplekml
+
     kml = simplekml.Kml()
     # linestring_data = [(p.lon, p.lat) for p in directions]
     line = kml.newlinestring(
         name=f"Route from {start.name} to {dest.name}", 
         description=f"Route from {start.name} to {dest.name}", 
-        coords=[Point(*c).to_tuple(swap=True) for c in route.polyline],
+        coords=[(lon, lat) for lat, lon in route.polyline],
         )
     
     line.style.linestyle.color = simplekml.Color.aqua
@@ -288,21 +535,21 @@ def generate_kml(start: Location, dest: Location, route: Route, output_path: Pat
             p.style = step_style
 
     
-    route_name = f"route_from_{start.name}_to_{dest.name}".replace(" ", "_")
+    route_name = route_name or f"route_from_{start.name}_to_{dest.name}".replace(" ", "_")
     outfile = output_path.joinpath(Path(route_name+".kml"))
     if use_blob:
-        resp = blob.put(str(outfile), bytes(kml.kml(), encoding="utf-8"), verbose=True, options={"allowOverwrite": "true"})
-        kml_path = resp.get("downloadUrl")
-        return kml_path
+        return upload_blob(outfile, kml.kml())
     else:
         with open(outfile, "w", encoding="utf-8") as f:
             f.write(kml.kml())
 
 
+@timed("export.maps_url")
 def generate_maps_url(route: Route, max_waypoints: int=10, embed: bool=False) -> str:
     """
     Generates a Google Maps directions URL from a Route object
-    Google Maps only supports <=10 waypoints in the URL, so the route is sampled at 10 equidistant points.
+    Google Maps only supports <=10 waypoints in the URL, so the route is sampled at 10 points spaced
+    evenly by distance along the route (not by vertex index, which bunches up in twisty sections).
     """
     coords = route.polyline
 
@@ -313,8 +560,7 @@ def generate_maps_url(route: Route, max_waypoints: int=10, embed: bool=False) ->
     end = Point(*coords[-1])
 
     if len(coords) > max_waypoints:
-        stepsize = len(coords) // (max_waypoints - 1)
-        waypoints = coords[1:-1:stepsize][:(max_waypoints - 2)]
+        waypoints = route.geometry_index.sample(max_waypoints)[1:-1]
     else:
         waypoints = coords[1:-1]
 
@@ -329,20 +575,24 @@ def generate_maps_url(route: Route, max_waypoints: int=10, embed: bool=False) ->
 
     return url
 
-def export_to_gpx(route: Route, outfile: Path, route_name: str="Route", use_blob: bool=False) -> None:
+@timed("export.gpx")
+def export_to_gpx(route: Route, outfile: Path, route_name: str="Route", use_blob: bool=False, elevations: Sequence[float] | None=None) -> None:
     gpx = f'''<?xml version="1.0" encoding="UTF-8"?>
 <gpx version="1.1" creator="leetRoute">
     <trk>
         <name>{route_name}</name>
         <trkseg>
     '''
-    for p in [Point(*c) for c in route.polyline]:
-        gpx += f'\t\t<trkpt lat="{p.lat}" lon="{p.lon}"></trkpt>\n'
+    for i, (lat, lon) in enumerate(route.polyline):
+        ele = elevations[i] if elevations is not None else math.nan
+        if math.isnan(ele):
+            gpx += f'\t\t<trkpt lat="{lat}" lon="{lon}"></trkpt>\n'
+        else:
+            gpx += f'\t\t<trkpt lat="{lat}" lon="{lon}"><ele>{ele:.1f}</ele></trkpt>\n'
     gpx += "\t\t</trkseg>\n\t</trk>\n</gpx>"
 
     if use_blob:
-        resp = blob.put(str(outfile), bytes(gpx, encoding="utf-8"), verbose=True, options={"allowOverwrite": "true"})
-        return resp.get("downloadUrl")
+        return upload_blob(outfile, gpx)
     else:
         with open(outfile, "w", encoding="utf-8") as f:
             f.write(gpx)
@@ -360,18 +610,26 @@ def export_route(
     """
     Export route in multiple formats.
     Returns dict with paths/URLs to exported files.
+
+    File names end in a hash of the route geometry, so a recalculated route gets new
+    files instead of overwriting ones another session (see `reuse_similar`) still links to.
     """
     if not use_blob:
         output_dir.mkdir(parents=True, exist_ok=True)
-    route_name = f"route_from_{start.name}_to_{dest.name}".replace(" ", "_")
+    route_name = f"route_from_{start.name}_to_{dest.name}_{route_version(route.geometry)[:8]}".replace(" ", "_")
     debug(f"{route_name=}")
     
     # results = {'embeds':{}}
     results = {}
     
+    # Elevation profile from local DEM tiles, when there are any
+    profile = elevation.profile_route(route.geometry_index)
+    if profile:
+        route.summary.update(profile.summary())
+
     # 1. KML Export
     kml_path = output_dir / f"{route_name}.kml"
-    kml_blob_path = generate_kml(start, dest, route, output_dir, use_blob)
+    kml_blob_path = generate_kml(start, dest, route, output_dir, use_blob, route_name)
     if use_blob and kml_blob_path:
         results['KML'] = kml_blob_path
     else:
@@ -381,11 +639,14 @@ def export_route(
     
     # 2. GPX Export
     gpx_path = output_dir / f"{route_name}.gpx"
-    gpx_blob_path = export_to_gpx(route, gpx_path, f"Route from {start.name} to {dest.name}", use_blob)
+    gpx_blob_path = export_to_gpx(
+        route, gpx_path, f"Route from {start.name} to {dest.name}", use_blob,
+        elevations=profile.vertex_elevations if profile else None
+    )
     if use_blob and gpx_blob_path:
         results['GPX'] = gpx_blob_path
     else:
-        results['GPX'] = f"/exports/{kml_path.name}"
+        results['GPX'] = f"/exports/{gpx_path.name}"
 
     # 3. Optional: JSON export with metadata
     maps_url = generate_maps_url(route)
@@ -395,15 +656,17 @@ def export_route(
         'dest': {'name': dest.name, 'coords': dest.coords.to_tuple()},
         'summary': route.summary,
         'curvature': analyse_curvature(route),
-        'polyline': route.polyline,
+        'segmentation': segment_route(route.geometry_index).summary(),
+        'road_info': summarise_extras(route.extras, route.geometry_index),
+        'polyline': list(route.polyline),
         'google_maps_url': maps_url
     }
-    if use_blob:
-        resp = blob.put(str(json_path), bytes(json.dumps(route_data), encoding="utf-8"), verbose=True, options={"allowOverwrite": "true"})
-        json_path = resp.get("downloadUrl")
-    else:
-        with open(json_path, 'w', encoding="utf-8") as f:
-            json.dump(route_data, f, indent=2)
+    with span("export.json"):
+        if use_blob:
+            json_path = upload_blob(json_path, json.dumps(route_data))
+        else:
+            with open(json_path, 'w', encoding="utf-8") as f:
+                json.dump(route_data, f, indent=2)
 
     results['JSON'] = str(json_path)
 
@@ -453,28 +716,248 @@ def names_from_result(result: dict) -> list[str]:
     return names
 
 
-def main(start: Point, dest: Point, use_blob: bool=True) -> dict[str, str]:
-    start_geocode = reverse_geocode(start)
-    start_geocode["coords"] = dataclasses.asdict(start)
-    dest_geocode = reverse_geocode(dest)
-    dest_geocode["coords"] = dataclasses.asdict(dest)
-    start_name = names_from_result(start_geocode)[0]
-    dest_name = names_from_result(dest_geocode)[0]
+@dataclasses.dataclass
+class RouteSession:
+    """Everything needed to recalculate a route after one of its stops moves"""
+    id: str
+    stops: list[Location]
+    legs: list[Route]
+    route: Route
+    results: dict[str, str]
+    use_blob: bool=True
+
+
+def _export_refs(session: RouteSession) -> set[str]:
+    return {session.results[fmt] for fmt in EXPORT_FORMATS if session.results.get(fmt)}
+
+
+def release_exports(session: RouteSession) -> None:
+    """Delete the exports of a session that was replaced or evicted, unless a live session still links to them
+
+    Export names are content hashes, so sessions created by `reuse_similar` and
+    recalculations that land on the same geometry share files.
+    """
+    refs = _export_refs(session)
+    for live in SESSIONS.values():
+        refs -= _export_refs(live)
+    for ref in refs:
+        delete_export(ref)
+
+
+SESSIONS = LRUCache("route_sessions", MAX_SESSIONS, on_evict=lambda session_id, session: release_exports(session))
+
+
+def locate(point: Point) -> Location:
+    """Reverse-geocode a point into a named Location"""
+    geocode = reverse_geocode(point)
+    geocode["coords"] = dataclasses.asdict(point)
     # with open("res.start.json", "w", encoding="utf-8") as f:
-    #     json.dump(start_geocode, f, indent=4)
-    # with open("res.dest.json", "w", encoding="utf-8") as f:
-    #     json.dump(dest_geocode, f, indent=4)
-    start = Location(coords=start,name=start_name)
-    dest = Location(coords=dest, name=dest_name)
-    directions = get_directions(start, dest)
-    return export_route(
-        directions.routes[0],
-        start=start,
-        dest=dest,
-        output_dir=Path("./exports"),
+    #     json.dump(geocode, f, indent=4)
+    return Location(coords=point, name=names_from_result(geocode)[0])
+
+
+async def locate_async(point: Point) -> Location:
+    """`locate` for the ASGI serving mode; shares the reverse-geocode cache"""
+    geocode = await reverse_geocode_async(point)
+    return Location(coords=point, name=names_from_result(geocode)[0])
+
+
+def plan_route(stops: list[Location], use_blob: bool=True, session_id: str | None=None, previous_legs: dict | None=None) -> dict[str, str]:
+    """Route through every stop in order, export it, and remember it as a session
+
+    Args:
+        stops (list[Location]): start, any via-points, and destination
+        use_blob (bool, optional): Upload exports to Vercel Blob. Defaults to True.
+        session_id (str | None, optional): id to store the session under. Defaults to a new id.
+        previous_legs (dict | None, optional): legs of an earlier version of this route keyed by `leg_key`, reused where the stops didn't change. Defaults to None.
+
+    Returns:
+        dict[str, str]: export results, plus the "route_id" to pass to `recalculate`
+    """
+    legs = get_legs(stops, previous_legs)
+    route = stitch_routes(legs)
+    results = export_route(
+        route,
+        start=stops[0],
+        dest=stops[-1],
+        output_dir=EXPORT_DIR,
         open_browser=False,
         use_blob=use_blob
     )
+    session_id = session_id or uuid4().hex
+    previous: RouteSession | None = SESSIONS.get(session_id)
+    session = RouteSession(id=session_id, stops=stops, legs=legs, route=route, results=results, use_blob=use_blob)
+    SESSIONS.put(session_id, session)
+    # the index holds only the id, so it never keeps a session alive past SESSIONS
+    similarity.ROUTES.add(session_id, [_latlon(stop.coords) for stop in stops], (session_id, use_blob))
+    if previous is not None:
+        release_exports(previous)
+    return {**results, "route_id": session_id}
+
+
+def _latlon(point: Point) -> tuple[float, float]:
+    # request points arrive as "lon,lat", so Point.lat holds the longitude
+    return point.lon, point.lat
+
+
+def reuse_similar(points: list[Point], use_blob: bool=True) -> dict[str, str] | None:
+    """Answer a request from a stored route whose stops are all within the similarity tolerance
+
+    The stored route, its analysis and its exports are shared; only a new session is
+    created, so moving a stop later recalculates from the stored legs. Export files are
+    named by route geometry, so that recalculation writes new ones rather than
+    replacing those the other session links to.
+
+    Args:
+        points (list[Point]): requested start, via-points and destination
+        use_blob (bool, optional): whether the caller wants Vercel Blob exports. Defaults to True.
+
+    Returns:
+        dict[str, str] | None: export results and a new "route_id", or None if nothing similar is stored
+    """
+    match = find_similar(points, use_blob)
+    if match is None:
+        return None
+    debug(f"reusing route {match.id}")
+    session_id = uuid4().hex
+    SESSIONS.put(session_id, dataclasses.replace(match, id=session_id))
+    return {**match.results, "route_id": session_id}
+
+
+def find_similar(points: list[Point], use_blob: bool=True, record: bool=True) -> RouteSession | None:
+    """Look up the live session of a stored route similar to `points`, dropping index entries whose session has expired"""
+    while True:
+        found = similarity.ROUTES.find(
+            [_latlon(p) for p in points],
+            accept=lambda entry: entry[1] == use_blob,
+            record=record
+        )
+        if found is None:
+            return None
+        session: RouteSession | None = SESSIONS.get(found[0])
+        if session is not None:
+            return session
+        similarity.ROUTES.discard(found[0])
+
+
+def recalculate(route_id: str, which: Literal["start", "dest", "via"], point: Point, via_index: int=0, insert: bool=False) -> dict[str, str]:
+    """Recalculate a previously planned route after one stop is moved or added
+
+    Only the moved stop is geocoded again and only the legs touching it are fetched;
+    the other legs and geocodes come from the stored session.
+
+    Args:
+        route_id (str): "route_id" returned by `main` or an earlier `recalculate`
+        which (Literal["start", "dest", "via"]): which stop changed
+        point (Point): new position of that stop
+        via_index (int, optional): which via-point changed, or where to insert a new one. Defaults to 0.
+        insert (bool, optional): add `point` as a new via-point instead of moving one. Defaults to False.
+
+    Raises:
+        KeyError: the route id is unknown or has expired
+        IndexError: the via-point index is out of range
+
+    Returns:
+        dict[str, str]
+    """
+    session: RouteSession | None = SESSIONS.get(route_id)
+    if session is None:
+        raise KeyError(f"unknown route id '{route_id}'")
+
+    index = _stop_index(session, which, via_index, insert)
+    stops = _move_stop(session, index, locate(point), insert=which == "via" and insert)
+    return plan_route(stops, use_blob=session.use_blob, session_id=route_id, previous_legs=_session_legs(session))
+
+
+async def prefetch_recalculate(route_id: str, which: Literal["start", "dest", "via"], point: Point, via_index: int=0, insert: bool=False) -> None:
+    """Fetch the geocode and legs `recalculate` would wait on, without blocking the event loop
+
+    Only the moved stop is reverse-geocoded and only the legs touching it are fetched,
+    as `recalculate` does; nothing is fetched for an unknown route id.
+    """
+    session: RouteSession | None = SESSIONS.get(route_id)
+    if session is None:
+        return
+    index = _stop_index(session, which, via_index, insert)
+    stops = _move_stop(session, index, await locate_async(point), insert=which == "via" and insert)
+    previous_legs = _session_legs(session)
+    legs = []
+    for a, b in zip(stops, stops[1:]):
+        key = leg_key(a, b)
+        leg = previous_legs.get(key)
+        legs.append(leg if leg is not None else LEG_CACHE.get(key))
+    await _fetch_missing_async(stops, legs)
+
+
+def _stop_index(session: RouteSession, which: str, via_index: int, insert: bool) -> int:
+    match which:
+        case "start":
+            return 0
+        case "dest":
+            return len(session.stops) - 1
+        case "via":
+            index = via_index + 1
+            if not 0 < index < (len(session.stops) if insert else len(session.stops) - 1):
+                raise IndexError(f"via-point {via_index} out of range")
+            return index
+        case _:
+            raise ValueError(f"unknown stop type '{which}'")
+
+
+def _move_stop(session: RouteSession, index: int, moved: Location, insert: bool) -> list[Location]:
+    stops = list(session.stops)
+    if insert:
+        stops.insert(index, moved)
+    else:
+        stops[index] = moved
+    return stops
+
+
+def _session_legs(session: RouteSession) -> dict:
+    return {leg_key(a, b): leg for a, b, leg in zip(session.stops, session.stops[1:], session.legs)}
+
+
+def locate_all(points: list[Point]) -> list[Location]:
+    """Reverse-geocode several points concurrently, keeping their order"""
+    if len(points) <= 2:
+        return [locate(p) for p in points]
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(points))) as pool:
+        futures = [pool.submit(copy_context().run, locate, p) for p in points]
+        return [future.result() for future in futures]
+
+
+async def prefetch_route(start: Point, dest: Point, via: list[Point] | None=None, use_blob: bool=USE_BLOB) -> None:
+    """Fetch every geocode and leg `main` would wait on, without blocking the event loop
+
+    The ASGI serving mode awaits this before handing a request to the Flask view, so
+    the view's call to `main` finds everything in the caches and only exports.
+    Nothing is fetched if a similar stored route will be reused anyway.
+    """
+    import asyncio
+
+    points = [start, *(via or []), dest]
+    if find_similar(points, use_blob, record=False) is not None:
+        return
+    stops = await asyncio.gather(*(locate_async(p) for p in points))
+    await _fetch_missing_async(stops, [LEG_CACHE.get(leg_key(a, b)) for a, b in zip(stops, stops[1:])])
+
+
+async def _fetch_missing_async(stops: list[Location], legs: list[Route | None]) -> None:
+    """Fetch the legs that are None in chunked requests, at most MAX_PARALLEL_REQUESTS at a time; they land in the leg cache"""
+    import asyncio
+
+    limit = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
+
+    async def fetch(first: int, end: int) -> None:
+        async with limit:
+            await fetch_legs_async(stops[first:end + 1])
+
+    await asyncio.gather(*(fetch(first, end) for first, end in missing_chunks(legs)))
+
+
+def main(start: Point, dest: Point, via: list[Point] | None=None, use_blob: bool=USE_BLOB) -> dict[str, str]:
+    points = [start, *(via or []), dest]
+    return reuse_similar(points, use_blob) or plan_route(locate_all(points), use_blob=use_blob)
 # generate_kml(directions.routes[0], Path("./"))
 # curvature = analyse_curvature(directions.routes[0])
 # maps_url = generate_maps_url(directions.routes[0])
@@ -0,0 +1,190 @@
+import math
+from array import array
+from dataclasses import dataclass
+from enum import Enum
+from typing import Self, Sequence
+
+
+# mean Earth radius (IUGG), which is what the haversine formula assumes
+EARTH_RADIUS_M = 6371008.8
+EARTH_RADIUS_KM = EARTH_RADIUS_M / 1000
+EARTH_RADIUS_MI = EARTH_RADIUS_M / 1609.344
+
+
+class DistanceUnit(Enum):
+    MILES = "miles"
+    KILOMETERS = "kilometers"
+
+
+RADIUS_BY_UNIT = {DistanceUnit.MILES: EARTH_RADIUS_MI, DistanceUnit.KILOMETERS: EARTH_RADIUS_KM}
+
+
+# --- scalar ---------------------------------------------------------------------------------
+# all angles are in degrees and distances in the units of `radius` (metres by default)
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float, radius: float=EARTH_RADIUS_M) -> float:
+    """Great-circle distance between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    h = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * radius * math.asin(min(1.0, math.sqrt(h)))
+
+
+def bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Initial bearing from the first point towards the second, clockwise from north in [0, 360)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlam = math.radians(lon2 - lon1)
+    x = math.sin(dlam) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlam)
+    return math.degrees(math.atan2(x, y)) % 360
+
+
+def destination(lat: float, lon: float, heading: float, distance: float, radius: float=EARTH_RADIUS_M) -> tuple[float, float]:
+    """Point reached by travelling `distance` along a great circle from (lat, lon) at initial bearing `heading`
+
+    Returns:
+        tuple[float, float]: (lat, lon), longitude normalised to [-180, 180)
+    """
+    phi, theta, delta = math.radians(lat), math.radians(heading), distance / radius
+    sin_phi2 = math.sin(phi) * math.cos(delta) + math.cos(phi) * math.sin(delta) * math.cos(theta)
+    phi2 = math.asin(max(-1.0, min(1.0, sin_phi2)))
+    lam2 = math.radians(lon) + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi), math.cos(delta) - math.sin(phi) * sin_phi2)
+    return math.degrees(phi2), (math.degrees(lam2) + 540) % 360 - 180
+
+
+def cross_track(lat: float, lon: float, lat1: float, lon1: float, lat2: float, lon2: float, radius: float=EARTH_RADIUS_M) -> float:
+    """Signed distance from (lat, lon) to the great circle through points 1 and 2
+
+    Positive when the point lies to the right of the path from 1 to 2.
+    """
+    delta13 = haversine(lat1, lon1, lat, lon, 1.0)
+    theta13 = math.radians(bearing(lat1, lon1, lat, lon))
+    theta12 = math.radians(bearing(lat1, lon1, lat2, lon2))
+    return math.asin(max(-1.0, min(1.0, math.sin(delta13) * math.sin(theta13 - theta12)))) * radius
+
+
+# --- batched --------------------------------------------------------------------------------
+# arrays in, array('d') out; radians, sines and cosines are taken once per vertex
+
+def vertex_trig(lats: Sequence[float], lons: Sequence[float]) -> tuple[array, array, array, array]:
+    """Latitudes and longitudes in radians, with the sine and cosine of each latitude
+
+    The edge functions below take this as `trig` so a caller that needs both lengths
+    and bearings of the same polyline converts it once.
+
+    Returns:
+        tuple[array, array, array, array]: phi, lambda, sin(phi), cos(phi)
+    """
+    phi = array("d", map(math.radians, lats))
+    lam = array("d", map(math.radians, lons))
+    return phi, lam, array("d", map(math.sin, phi)), array("d", map(math.cos, phi))
+
+
+def edge_lengths(lats: Sequence[float], lons: Sequence[float], radius: float=EARTH_RADIUS_M, trig: tuple[array, array, array, array] | None=None) -> array:
+    """Great-circle length of each edge of a polyline
+
+    Args:
+        lats (Sequence[float]): vertex latitudes
+        lons (Sequence[float]): vertex longitudes
+        radius (float, optional): sphere radius, which sets the output unit. Defaults to EARTH_RADIUS_M.
+        trig (tuple | None, optional): `vertex_trig(lats, lons)`, if already computed. Defaults to None.
+
+    Returns:
+        array: n - 1 lengths, edge i running from vertex i to i + 1
+    """
+    n = len(lats)
+    phi, lam, _, cos_phi = trig or vertex_trig(lats, lons)
+    out = array("d", bytes(8 * max(n - 1, 0)))
+    for i in range(n - 1):
+        h = math.sin((phi[i + 1] - phi[i]) / 2) ** 2 + cos_phi[i] * cos_phi[i + 1] * math.sin((lam[i + 1] - lam[i]) / 2) ** 2
+        out[i] = 2 * radius * math.asin(min(1.0, math.sqrt(h)))
+    return out
+
+
+def edge_bearings(lats: Sequence[float], lons: Sequence[float], trig: tuple[array, array, array, array] | None=None) -> array:
+    """Initial bearing of each edge of a polyline, in degrees clockwise from north
+
+    Returns:
+        array: n - 1 bearings in [0, 360)
+    """
+    n = len(lats)
+    _, lam, sin_phi, cos_phi = trig or vertex_trig(lats, lons)
+    out = array("d", bytes(8 * max(n - 1, 0)))
+    for i in range(n - 1):
+        dlam = lam[i + 1] - lam[i]
+        x = math.sin(dlam) * cos_phi[i + 1]
+        y = cos_phi[i] * sin_phi[i + 1] - sin_phi[i] * cos_phi[i + 1] * math.cos(dlam)
+        out[i] = math.degrees(math.atan2(x, y)) % 360
+    return out
+
+
+def haversine_many(lats1: Sequence[float], lons1: Sequence[float], lats2: Sequence[float], lons2: Sequence[float], radius: float=EARTH_RADIUS_M) -> array:
+    """Element-wise great-circle distance between two equally long point arrays"""
+    phi1, lam1, _, cos1 = vertex_trig(lats1, lons1)
+    phi2, lam2, _, cos2 = vertex_trig(lats2, lons2)
+    out = array("d", bytes(8 * len(phi1)))
+    for i in range(len(phi1)):
+        h = math.sin((phi2[i] - phi1[i]) / 2) ** 2 + cos1[i] * cos2[i] * math.sin((lam2[i] - lam1[i]) / 2) ** 2
+        out[i] = 2 * radius * math.asin(min(1.0, math.sqrt(h)))
+    return out
+
+
+def destination_many(lat: float, lon: float, headings: Sequence[float], distances: Sequence[float], radius: float=EARTH_RADIUS_M) -> tuple[array, array]:
+    """`destination` from one origin for many (bearing, distance) pairs
+
+    Returns:
+        tuple[array, array]: latitudes and longitudes
+    """
+    phi, lam = math.radians(lat), math.radians(lon)
+    sin_phi, cos_phi = math.sin(phi), math.cos(phi)
+    lats = array("d", bytes(8 * len(headings)))
+    lons = array("d", bytes(8 * len(headings)))
+    for i, (heading, distance) in enumerate(zip(headings, distances)):
+        theta, delta = math.radians(heading), distance / radius
+        sin_delta, cos_delta = math.sin(delta), math.cos(delta)
+        sin_phi2 = max(-1.0, min(1.0, sin_phi * cos_delta + cos_phi * sin_delta * math.cos(theta)))
+        lam2 = lam + math.atan2(math.sin(theta) * sin_delta * cos_phi, cos_delta - sin_phi * sin_phi2)
+        lats[i] = math.degrees(math.asin(sin_phi2))
+        lons[i] = (math.degrees(lam2) + 540) % 360 - 180
+    return lats, lons
+
+
+def cross_track_many(lats: Sequence[float], lons: Sequence[float], lat1: float, lon1: float, lat2: float, lon2: float, radius: float=EARTH_RADIUS_M) -> array:
+    """Signed distance of many points from the great circle through points 1 and 2, positive to the right"""
+    phi1, lam1 = math.radians(lat1), math.radians(lon1)
+    sin1, cos1 = math.sin(phi1), math.cos(phi1)
+    theta12 = math.radians(bearing(lat1, lon1, lat2, lon2))
+    phi, lam, sin_phi, cos_phi = vertex_trig(lats, lons)
+    out = array("d", bytes(8 * len(phi)))
+    for i in range(len(phi)):
+        dlam = lam[i] - lam1
+        h = math.sin((phi[i] - phi1) / 2) ** 2 + cos1 * cos_phi[i] * math.sin(dlam / 2) ** 2
+        delta13 = 2 * math.asin(min(1.0, math.sqrt(h)))
+        theta13 = math.atan2(math.sin(dlam) * cos_phi[i], cos1 * sin_phi[i] - sin1 * cos_phi[i] * math.cos(dlam))
+        out[i] = math.asin(max(-1.0, min(1.0, math.sin(delta13) * math.sin(theta13 - theta12)))) * radius
+    return out
+
+
+# --- Point ----------------------------------------------------------------------------------
+
+@dataclass
+class Point:
+    lat: float | int=0
+    lon: float | int=0
+
+    def distance(self, other: Self, unit: DistanceUnit | str=DistanceUnit.KILOMETERS) -> float:
+        """Great-circle distance to `other` in miles or kilometres"""
+        return haversine(self.lat, self.lon, other.lat, other.lon, RADIUS_BY_UNIT[DistanceUnit(unit)])
+
+    def bearing(self, other: Self) -> float:
+        """Initial bearing towards `other`, in degrees clockwise from north"""
+        return bearing(self.lat, self.lon, other.lat, other.lon)
+
+    @classmethod
+    def from_tuple(cls, data: tuple[float,float]) -> Self:
+        return cls(*data)
+
+    def to_tuple(self, swap: bool=False) -> tuple[float,float]:
+        return (self.lon, self.lat) if swap else (self.lat, self.lon)
+
+    def __repr__(self) -> str:
+        return f"Point({self.lat}, {self.lon})"
@@ -0,0 +1,97 @@
+from array import array
+from bisect import bisect_right
+from functools import cached_property
+from typing import Sequence
+from polycodec import Polyline
+from geodesy import edge_bearings, edge_lengths, vertex_trig
+
+
+class RouteIndex:
+    """Cumulative-distance index over a route polyline
+
+    Built once per route in O(n). Answers "where is the point `d` metres along the
+    route" in O(log n) by bisecting the cumulative distance array, which lets
+    callers take samples that are evenly spaced along the road rather than
+    evenly spaced over vertex indices.
+    """
+
+    def __init__(self, coords: Sequence[tuple[float, float]]) -> None:
+        """
+        Args:
+            coords (Sequence[tuple[float, float]]): (lat, lon) vertices, as decoded from the route geometry
+        """
+        n = len(coords)
+        if isinstance(coords, Polyline):
+            self.lats, self.lons = coords.lats(), coords.lons()
+        else:
+            self.lats = array("d", (c[0] for c in coords))
+            self.lons = array("d", (c[1] for c in coords))
+        self.cumdist = array("d", bytes(8 * n))
+        # kept for `bearings`, so curvature and segmentation don't convert the vertices again
+        self.trig = vertex_trig(self.lats, self.lons)
+
+        total = 0.0
+        for i, length in enumerate(edge_lengths(self.lats, self.lons, trig=self.trig), 1):
+            total += length
+            self.cumdist[i] = total
+
+    def __len__(self) -> int:
+        return len(self.cumdist)
+
+    @cached_property
+    def bearings(self) -> array:
+        """Initial bearing of each edge in degrees, computed on first access"""
+        return edge_bearings(self.lats, self.lons, trig=self.trig)
+
+    @property
+    def total_distance(self) -> float:
+        """Length of the route in metres"""
+        return self.cumdist[-1] if self.cumdist else 0.0
+
+    def locate(self, distance: float) -> tuple[int, float]:
+        """Find the edge containing the point `distance` metres along the route
+
+        Args:
+            distance (float): metres from the start, clamped to the route length
+
+        Returns:
+            tuple[int, float]: index of the edge's first vertex, and the fraction of the way along that edge
+        """
+        n = len(self.cumdist)
+        if n < 2 or distance <= 0:
+            return 0, 0.0
+        if distance >= self.cumdist[-1]:
+            return n - 2, 1.0
+        i = bisect_right(self.cumdist, distance) - 1
+        edge = self.cumdist[i + 1] - self.cumdist[i]
+        return i, (distance - self.cumdist[i]) / edge if edge else 0.0
+
+    def point_at(self, distance: float) -> tuple[float, float]:
+        """Interpolate the (lat, lon) point `distance` metres along the route
+
+        Args:
+            distance (float): metres from the start
+
+        Returns:
+            tuple[float, float]
+        """
+        if len(self.cumdist) == 1:
+            return self.lats[0], self.lons[0]
+        i, t = self.locate(distance)
+        lat = self.lats[i] + (self.lats[i + 1] - self.lats[i]) * t
+        lon = self.lons[i] + (self.lons[i + 1] - self.lons[i]) * t
+        return lat, lon
+
+    def sample(self, count: int) -> list[tuple[float, float]]:
+        """Take `count` points evenly spaced along the route, including both ends
+
+        Args:
+            count (int): number of points, at least 2
+
+        Returns:
+            list[tuple[float, float]]
+        """
+        if count < 2:
+            raise ValueError("sampling a route needs at least 2 points")
+        step = self.total_distance / (count - 1)
+        return [self.point_at(k * step) for k in range(count)]
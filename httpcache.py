@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+from pathlib import Path
+from flask import Flask, Request, Response, request
+from config import CONFIG
+from cache import LRUCache
+
+
+__HTTP_ROOT = CONFIG.get("http", {})
+
+COMPRESS_MIN_BYTES = __HTTP_ROOT.get("compress_min_bytes", 512)
+GZIP_LEVEL = __HTTP_ROOT.get("gzip_level", 6)
+BROTLI_QUALITY = __HTTP_ROOT.get("brotli_quality", 5)
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/geo+json",
+    "application/kml",
+    "application/gpx",
+    "application/javascript",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+# content hashes keyed by (path, mtime, size), so a file is only hashed again after it changes
+FILE_HASHES = LRUCache("file_hashes", __HTTP_ROOT.get("hash_cache_size", 512))
+
+
+def file_hash(path: Path) -> str:
+    """Content hash of a file, for ETags and static asset fingerprints"""
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    digest = FILE_HASHES.get(key)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha1").hexdigest()[:20]
+        FILE_HASHES.put(key, digest)
+    return digest
+
+
+def _encoding_for(request: Request) -> str | None:
+    accepted = request.accept_encodings
+    if accepted["br"] and _brotli() is not None:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compress_response(response: Response, request: Request) -> Response:
+    """Brotli- or gzip-encode text responses the client accepts
+
+    The ETag is made weak after encoding, since the bytes differ from the identity
+    representation; If-None-Match uses weak comparison, so revalidation still gives 304s.
+
+    Args:
+        response (Response): outgoing response
+        request (Request): the request it answers
+
+    Returns:
+        Response
+    """
+    if (
+        response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding_for(request)
+    if encoding is None:
+        return response
+
+    # exports are sent as files; they are small enough to read and encode in one go
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    if encoding == "br":
+        data = _brotli().compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """Fingerprint static asset URLs and compress responses
+
+    `url_for('static', ...)` gains a `v=<content hash>` parameter. Requests carrying
+    the current hash are served as immutable for a year, so theme stylesheets and
+    scripts are only downloaded again after they change.
+    """
+    static_folder = Path(app.static_folder)
+
+    @app.url_defaults
+    def fingerprint_static(endpoint: str, values: dict) -> None:
+        if endpoint != "static" or "v" in values:
+            return
+        # templates pass filenames like '/css/base.light.css'; without the leading slash the URL doesn't redirect
+        values["filename"] = values.get("filename", "").lstrip("/")
+        path = static_folder / values["filename"]
+        if path.is_file():
+            values["v"] = file_hash(path)
+
+    @app.after_request
+    def cache_and_compress(response: Response) -> Response:
+        if request.endpoint == "static" and response.status_code in (200, 304):
+            path = static_folder / (request.view_args or {}).get("filename", "").lstrip("/")
+            version = request.args.get("v")
+            if version and path.is_file() and version == file_hash(path):
+                response.cache_control.public = True
+                response.cache_control.max_age = STATIC_MAX_AGE
+                response.cache_control.immutable = True
+                response.cache_control.no_cache = None
+        return compress_response(response, request)
@@ -0,0 +1,209 @@
+import time
+import threading
+import bisect
+import inspect
+import hmac
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from os import getenv
+from typing import Any, Callable, Iterator
+from config import CONFIG
+
+
+__METRICS_ROOT = CONFIG.get("metrics", {})
+
+METRICS_ENABLED = __METRICS_ROOT.get("enabled", False)
+TIMING_HEADER = __METRICS_ROOT.get("timing_header", False)
+
+# latency buckets in seconds, from fast cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_SPAN = nullcontext()
+_request_timings: ContextVar[list[tuple[str, float]] | None] = ContextVar("request_timings", default=None)
+
+
+def scrape_allowed(authorization: str | None) -> bool:
+    """Whether an Authorization header may read /metrics
+
+    Scrapes need `Authorization: Bearer <METRICS_TOKEN>`; with no METRICS_TOKEN in the
+    environment the endpoint stays closed even when metrics are enabled.
+    """
+    # read per call, since the engine loads .env after this module is imported
+    token = getenv("METRICS_TOKEN")
+    if not token or not authorization:
+        return False
+    scheme, _, credentials = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(credentials.strip(), token)
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus exposition layout"""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide store for span latencies and cache hit/miss counters"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.histograms: dict[str, Histogram] = {}
+        self.cache_hits: dict[str, int] = {}
+        self.cache_misses: dict[str, int] = {}
+        self.counters: dict[tuple[str, tuple[tuple[str, str], ...]], int] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def record_cache(self, name: str, hit: bool) -> None:
+        with self._lock:
+            counter = self.cache_hits if hit else self.cache_misses
+            counter[name] = counter.get(name, 0) + 1
+
+    def increment(self, name: str, labels: tuple[tuple[str, str], ...]) -> None:
+        with self._lock:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format
+
+        Returns:
+            str
+        """
+        lines = [
+            "# HELP leetroute_span_seconds Time spent in an instrumented stage",
+            "# TYPE leetroute_span_seconds histogram",
+        ]
+        with self._lock:
+            for name, hist in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f'leetroute_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'leetroute_span_seconds_bucket{{span="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'leetroute_span_seconds_sum{{span="{name}"}} {hist.total:.6f}')
+                lines.append(f'leetroute_span_seconds_count{{span="{name}"}} {hist.count}')
+
+            caches = sorted(set(self.cache_hits) | set(self.cache_misses))
+            lines.append("# HELP leetroute_cache_requests_total Cache lookups by result")
+            lines.append("# TYPE leetroute_cache_requests_total counter")
+            for name in caches:
+                lines.append(f'leetroute_cache_requests_total{{cache="{name}",result="hit"}} {self.cache_hits.get(name, 0)}')
+                lines.append(f'leetroute_cache_requests_total{{cache="{name}",result="miss"}} {self.cache_misses.get(name, 0)}')
+            lines.append("# HELP leetroute_cache_hit_ratio Fraction of cache lookups that were hits")
+            lines.append("# TYPE leetroute_cache_hit_ratio gauge")
+            for name in caches:
+                hits = self.cache_hits.get(name, 0)
+                total = hits + self.cache_misses.get(name, 0)
+                lines.append(f'leetroute_cache_hit_ratio{{cache="{name}"}} {hits / total if total else 0:.6f}')
+
+            counter_names = sorted({name for name, _ in self.counters})
+            for name in counter_names:
+                lines.append(f"# TYPE leetroute_{name}_total counter")
+                for (cname, labels), value in sorted(self.counters.items()):
+                    if cname != name:
+                        continue
+                    label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"leetroute_{name}_total{{{label_str}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def _span(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        REGISTRY.observe(name, elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def span(name: str):
+    """Time a block of code under `name`. Does nothing when metrics are disabled
+
+    Args:
+        name (str): stage name, e.g. "ors.directions"
+    """
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _span(name)
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of `span`; works on coroutine functions too"""
+    def decorator(func: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                with _span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            with _span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(name: str, hit: bool) -> None:
+    """Count a cache lookup towards the hit ratio of `name`"""
+    if METRICS_ENABLED:
+        REGISTRY.record_cache(name, hit)
+
+
+def increment(name: str, **labels: str) -> None:
+    """Count an event, e.g. increment("admission", upstream="ors", result="shed")"""
+    if METRICS_ENABLED:
+        REGISTRY.increment(name, tuple(sorted(labels.items())))
+
+
+def start_request() -> None:
+    """Begin collecting per-request stage timings for the timing header"""
+    if METRICS_ENABLED and TIMING_HEADER:
+        _request_timings.set([])
+
+
+def finish_request() -> str | None:
+    """Stop collecting per-request timings
+
+    Returns:
+        str | None: a `Server-Timing` header value, or None if nothing was collected
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return None
+    _request_timings.set(None)
+    totals: dict[str, float] = {}
+    for name, elapsed in timings:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in totals.items())
+
+
+def render() -> str:
+    return REGISTRY.render()
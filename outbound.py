@@ -0,0 +1,54 @@
+import asyncio
+from config import CONFIG, LEETROUTE_VERSION
+
+
+__ASGI_ROOT = CONFIG.get("asgi", {})
+
+MAX_CONNECTIONS = __ASGI_ROOT.get("max_connections", 100)
+TIMEOUT_S = __ASGI_ROOT.get("upstream_timeout_s", 30)
+
+# aiohttp is only needed by the ASGI serving mode, so it is imported on first use
+_session = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+
+
+def http_session():
+    """Pooled HTTP session shared by every outbound call on the running event loop
+
+    Requests beyond MAX_CONNECTIONS wait in the connector for a free connection.
+
+    Returns:
+        aiohttp.ClientSession
+    """
+    global _session, _session_loop
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    if _session is None or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            headers={"User-Agent": f"leetRoute/{LEETROUTE_VERSION}"},
+            connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=TIMEOUT_S),
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close() -> None:
+    """Close the shared session, e.g. on ASGI lifespan shutdown"""
+    global _session, _session_loop
+    if _session is not None:
+        await _session.close()
+    _session = _session_loop = None
+
+
+async def get_json(url: str, params: dict | None=None, headers: dict | None=None) -> dict:
+    async with http_session().get(url, params=params, headers=headers) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+
+async def post_json(url: str, body: dict, headers: dict | None=None) -> dict:
+    async with http_session().post(url, json=body, headers=headers) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
@@ -0,0 +1,191 @@
+import math
+import json
+import hashlib
+from array import array
+from config import CONFIG
+from cache import LRUCache
+from metrics import timed
+
+
+__OVERLAY_ROOT = CONFIG.get("overlay", {})
+
+MAX_ZOOM = __OVERLAY_ROOT.get("max_zoom", 18)
+TILE_SIZE = 256
+# simplification tolerance, in screen pixels at the zoom being served
+TOLERANCE_PX = __OVERLAY_ROOT.get("tolerance_px", 0.75)
+
+PYRAMID = LRUCache("overlay_levels", __OVERLAY_ROOT.get("level_cache_size", 256))
+TILES = LRUCache("overlay_tiles", __OVERLAY_ROOT.get("tile_cache_size", 2048))
+
+
+def route_version(geometry: str) -> str:
+    """Short content hash of an encoded route geometry, used in cache keys and ETags"""
+    return hashlib.sha1(geometry.encode("utf-8")).hexdigest()[:16]
+
+
+def project(coords: list[tuple[float, float]]) -> tuple[array, array]:
+    """Project (lat, lon) vertices to Web Mercator, normalised so the world spans [0, 1]"""
+    xs = array("d", bytes(8 * len(coords)))
+    ys = array("d", bytes(8 * len(coords)))
+    for i, (lat, lon) in enumerate(coords):
+        lat = max(min(lat, 85.05112878), -85.05112878)
+        s = math.sin(math.radians(lat))
+        xs[i] = (lon + 180) / 360
+        ys[i] = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return xs, ys
+
+
+def simplify(xs: array, ys: array, tolerance: float) -> array:
+    """Douglas-Peucker simplification, iterative so long routes can't hit the recursion limit
+
+    Args:
+        xs (array): projected x coordinates
+        ys (array): projected y coordinates
+        tolerance (float): maximum distance a dropped vertex may lie from the simplified line
+
+    Returns:
+        array: indices of the vertices to keep, in order
+    """
+    n = len(xs)
+    if n < 3:
+        return array("l", range(n))
+    keep = bytearray(n)
+    keep[0] = keep[-1] = 1
+    tol2 = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        seg2 = dx * dx + dy * dy
+        worst, worst_d2 = -1, tol2
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+                px, py = px - t * dx, py - t * dy
+            d2 = px * px + py * py
+            if d2 > worst_d2:
+                worst, worst_d2 = i, d2
+        if worst >= 0:
+            keep[worst] = 1
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return array("l", (i for i in range(n) if keep[i]))
+
+
+def bucket_edges(xs: array, ys: array, z: int) -> dict[tuple[int, int], array]:
+    """Index the edges of a simplified route by the zoom `z` tiles they run through
+
+    Each edge is cut into pieces no longer than a tile along either axis, and a piece
+    is filed under every tile its bounding box touches once the tile is padded by the
+    simplification tolerance. A long diagonal edge therefore lands only in the tiles
+    along it rather than in every tile of its bounding box.
+
+    Args:
+        xs (array): projected x coordinates of the kept vertices
+        ys (array): projected y coordinates of the kept vertices
+        z (int): zoom level
+
+    Returns:
+        dict[tuple[int, int], array]: edge indices in route order, keyed by tile (x, y)
+    """
+    scale = 2 ** z
+    pad = TOLERANCE_PX / TILE_SIZE
+    buckets: dict[tuple[int, int], array] = {}
+    for i in range(len(xs) - 1):
+        ax, ay = xs[i] * scale, ys[i] * scale
+        dx, dy = xs[i + 1] * scale - ax, ys[i + 1] * scale - ay
+        pieces = max(1, math.ceil(max(abs(dx), abs(dy))))
+        tiles: set[tuple[int, int]] = set()
+        for k in range(pieces):
+            px0, px1 = ax + dx * k / pieces, ax + dx * (k + 1) / pieces
+            py0, py1 = ay + dy * k / pieces, ay + dy * (k + 1) / pieces
+            # tile t, padded, spans [t - pad, t + 1 + pad] in tile units
+            tx0, tx1 = max(0, math.ceil(min(px0, px1) - 1 - pad)), min(scale - 1, math.floor(max(px0, px1) + pad))
+            ty0, ty1 = max(0, math.ceil(min(py0, py1) - 1 - pad)), min(scale - 1, math.floor(max(py0, py1) + pad))
+            tiles.update((tx, ty) for tx in range(tx0, tx1 + 1) for ty in range(ty0, ty1 + 1))
+        for key in tiles:
+            buckets.setdefault(key, array("l")).append(i)
+    return buckets
+
+
+def level(route_id: str, version: str, coords: list[tuple[float, float]], z: int) -> tuple[array, array, array, dict[tuple[int, int], array]]:
+    """The route simplified for zoom `z`, computed once per route version and cached
+
+    Returns:
+        tuple[array, array, array, dict]: kept vertex indices, their projected x and y, and `bucket_edges` of the simplified route
+    """
+    z = min(z, MAX_ZOOM)
+    key = (route_id, version, z)
+    cached = PYRAMID.get(key)
+    if cached is not None:
+        return cached
+
+    full = PYRAMID.get((route_id, version, None))
+    if full is None:
+        full = project(coords)
+        PYRAMID.put((route_id, version, None), full)
+    xs, ys = full
+    kept = simplify(xs, ys, TOLERANCE_PX / (TILE_SIZE * 2 ** z))
+    kept_xs, kept_ys = array("d", (xs[i] for i in kept)), array("d", (ys[i] for i in kept))
+    result = (kept, kept_xs, kept_ys, bucket_edges(kept_xs, kept_ys, z))
+    PYRAMID.put(key, result)
+    return result
+
+
+@timed("overlay.tile")
+def tile(route_id: str, geometry: str, coords: list[tuple[float, float]], z: int, x: int, y: int) -> tuple[str, bytes]:
+    """GeoJSON for the part of a route that crosses one XYZ map tile
+
+    Every simplified edge that runs through the tile is included whole, so each
+    piece runs from just outside the tile to just outside it and neighbouring tiles
+    meet without gaps. The edges come from the level's tile buckets, so serving a
+    tile only touches the edges near it.
+
+    Args:
+        route_id (str): route session id
+        geometry (str): the route's encoded geometry, used to version the cache
+        coords (list[tuple[float, float]]): the route's (lat, lon) polyline
+        z (int): zoom level
+        x (int): tile column
+        y (int): tile row
+
+    Returns:
+        tuple[str, bytes]: ETag and JSON body
+    """
+    version = route_version(geometry)
+    key = (route_id, version, z, x, y)
+    cached = TILES.get(key)
+    if cached is not None:
+        return cached
+
+    kept, _, _, buckets = level(route_id, version, coords, z)
+
+    lines: list[list[list[float]]] = []
+    current: list[list[float]] = []
+    previous = -1
+    for i in buckets.get((x, y), ()):
+        # consecutive edges join into one line; a gap means the route left the tile
+        if current and i != previous + 1:
+            lines.append(current)
+            current = []
+        if not current:
+            current.append(_lonlat(coords[kept[i]]))
+        current.append(_lonlat(coords[kept[i + 1]]))
+        previous = i
+    if current:
+        lines.append(current)
+
+    body = json.dumps({
+        "type": "Feature",
+        "properties": {"z": z, "x": x, "y": y},
+        "geometry": {"type": "MultiLineString", "coordinates": lines},
+    }, separators=(",", ":")).encode("utf-8")
+    etag = hashlib.sha1(body).hexdigest()[:20]
+    TILES.put(key, (etag, body))
+    return etag, body
+
+
+def _lonlat(c: tuple[float, float]) -> list[float]:
+    return [c[1], c[0]]
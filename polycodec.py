@@ -0,0 +1,169 @@
+import math
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Iterator, Self
+
+
+# polyline characters 95-126 carry a continuation bit; every other character ends a value
+_CONTINUATION = bytes(range(95, 127))
+
+
+class Polyline(Sequence):
+    """(lat, lon) vertices stored interleaved in one flat array('d')
+
+    Behaves like the list of tuples `polyline.decode` returns, so indexing,
+    iteration and unpacking work unchanged, but the coordinates live in a single
+    buffer instead of one tuple and two floats per vertex.
+    """
+
+    def __init__(self, data: array | None=None) -> None:
+        """
+        Args:
+            data (array | None, optional): interleaved lat, lon values. Defaults to an empty array.
+        """
+        self.data = data if data is not None else array("d")
+
+    @classmethod
+    def from_coords(cls, coords: Iterable[tuple[float, float]]) -> Self:
+        if isinstance(coords, Polyline):
+            return cls(array("d", coords.data))
+        return cls(array("d", (v for c in coords for v in c[:2])))
+
+    def __len__(self) -> int:
+        return len(self.data) // 2
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                return Polyline(self.data[2 * start:2 * max(start, stop)])
+            return Polyline.from_coords(self[j] for j in range(start, stop, step))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("polyline index out of range")
+        return self.data[2 * i], self.data[2 * i + 1]
+
+    def __iter__(self) -> Iterator[tuple[float, float]]:
+        it = iter(self.data)
+        return zip(it, it)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Polyline):
+            return self.data == other.data
+        if isinstance(other, Sequence):
+            return len(self) == len(other) and all(tuple(a) == tuple(b) for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Polyline({len(self)} vertices)"
+
+    def extend(self, other: Iterable[tuple[float, float]]) -> None:
+        self.data.extend(other.data if isinstance(other, Polyline) else (v for c in other for v in c[:2]))
+
+    def lats(self) -> array:
+        return self.data[0::2]
+
+    def lons(self) -> array:
+        return self.data[1::2]
+
+
+def vertex_count(expression: str) -> int:
+    """Number of vertices in an encoded polyline, counted without decoding it"""
+    data = expression.encode("ascii")
+    return len(data.translate(None, _CONTINUATION)) // 2
+
+
+def decode_range(expression: str, start: int=0, stop: int | None=None, precision: int=5) -> Polyline:
+    """Decode vertices `start` to `stop` of an encoded polyline
+
+    Coordinates are delta-encoded, so the values before `start` are still read, but
+    only as integers; nothing after `stop` is read at all. The output array is
+    allocated once at its final size.
+
+    Args:
+        expression (str): encoded polyline, e.g. a route's `geometry`
+        start (int, optional): first vertex to return. Defaults to 0.
+        stop (int | None, optional): vertex to stop before. Defaults to the end.
+        precision (int, optional): decimal places encoded. Defaults to 5, as ORS uses.
+
+    Returns:
+        Polyline
+    """
+    data = expression.encode("ascii")
+    total = vertex_count(expression)
+    start, stop, _ = slice(start, stop).indices(total)
+    stop = max(start, stop)
+    out = array("d", bytes(16 * (stop - start)))
+    factor = float(10 ** precision)
+
+    pos = lat = lon = 0
+    for vertex in range(stop):
+        result = shift = 0
+        while True:
+            b = data[pos] - 63
+            pos += 1
+            result |= (b & 0x1f) << shift
+            shift += 5
+            if b < 0x20:
+                break
+        lat += ~(result >> 1) if result & 1 else result >> 1
+
+        result = shift = 0
+        while True:
+            b = data[pos] - 63
+            pos += 1
+            result |= (b & 0x1f) << shift
+            shift += 5
+            if b < 0x20:
+                break
+        lon += ~(result >> 1) if result & 1 else result >> 1
+
+        if vertex >= start:
+            j = 2 * (vertex - start)
+            out[j] = lat / factor
+            out[j + 1] = lon / factor
+    return Polyline(out)
+
+
+def decode(expression: str, precision: int=5) -> Polyline:
+    """Decode an encoded polyline; gives the same values as `polyline.decode`
+
+    Args:
+        expression (str): encoded polyline
+        precision (int, optional): decimal places encoded. Defaults to 5.
+
+    Returns:
+        Polyline
+    """
+    return decode_range(expression, precision=precision)
+
+
+def _round(x: float) -> int:
+    # round half away from zero, as the reference implementation does
+    return int(math.copysign(math.floor(math.fabs(x) + 0.5), x))
+
+
+def encode(coords: Iterable[tuple[float, float]], precision: int=5) -> str:
+    """Encode (lat, lon) vertices; gives the same string as `polyline.encode`
+
+    Args:
+        coords (Iterable[tuple[float, float]]): a Polyline or any (lat, lon) sequence
+        precision (int, optional): decimal places to keep. Defaults to 5.
+
+    Returns:
+        str
+    """
+    factor = int(10 ** precision)
+    out = bytearray()
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        lat, lon = _round(lat * factor), _round(lon * factor)
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append((0x20 | (value & 0x1f)) + 63)
+                value >>= 5
+            out.append(value + 63)
+        prev_lat, prev_lon = lat, lon
+    return out.decode("ascii")
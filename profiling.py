@@ -0,0 +1,149 @@
+import sys
+import threading
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import Iterator
+from config import CONFIG
+
+
+__PROFILING_ROOT = CONFIG.get("profiling", {})
+
+PROFILING_ENABLED = __PROFILING_ROOT.get("enabled", False)
+SAMPLE_INTERVAL = __PROFILING_ROOT.get("interval_ms", 5) / 1000
+MAX_PROFILES = __PROFILING_ROOT.get("max_profiles", 20)
+MAX_PROFILE_BYTES = __PROFILING_ROOT.get("max_bytes", 256 * 1024)
+MAX_STACK_DEPTH = 128
+
+PROFILE_DIR = Path("./exports/profiles")
+PROFILE_HEADER = "X-LeetRoute-Profile"
+
+
+@dataclass
+class ProfileInfo:
+    name: str
+    size: int
+    created: datetime
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread at a fixed interval
+
+    Stacks are stored in the collapsed ("folded") format used by flamegraph.pl
+    and speedscope: one `outer;inner;leaf count` line per unique stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="leetroute-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = self._collapse(frame)
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    @staticmethod
+    def _collapse(frame: FrameType | None) -> str:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def folded(self, max_bytes: int = MAX_PROFILE_BYTES) -> str:
+        """Render collected stacks, heaviest first, truncated to `max_bytes`
+
+        Args:
+            max_bytes (int, optional): size cap for the output. Defaults to MAX_PROFILE_BYTES.
+
+        Returns:
+            str
+        """
+        lines = []
+        size = 0
+        for stack, count in sorted(self.stacks.items(), key=lambda kv: kv[1], reverse=True):
+            line = f"{stack} {count}\n"
+            size += len(line.encode("utf-8"))
+            if size > max_bytes:
+                break
+            lines.append(line)
+        return "".join(lines)
+
+
+def is_requested(args: dict, headers: dict) -> bool:
+    """Whether a request asked to be profiled via `?profile=1` or the profile header"""
+    if not PROFILING_ENABLED:
+        return False
+    flag = args.get("profile") or headers.get(PROFILE_HEADER)
+    return flag not in (None, "", "0", "false")
+
+
+def _save(label: str, profiler: SamplingProfiler) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    outfile = PROFILE_DIR / f"{stamp}_{label}.folded"
+    with open(outfile, "w", encoding="utf-8") as f:
+        f.write(profiler.folded())
+
+    # keep only the newest MAX_PROFILES dumps
+    dumps = sorted(PROFILE_DIR.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in dumps[MAX_PROFILES:]:
+        old.unlink(missing_ok=True)
+    return outfile
+
+
+@contextmanager
+def _profile(label: str) -> Iterator[None]:
+    profiler = SamplingProfiler(threading.get_ident())
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        _save(label, profiler)
+
+
+def profile_request(label: str, requested: bool):
+    """Profile the enclosed block if profiling is enabled and was requested
+
+    Args:
+        label (str): name to save the profile under, e.g. the endpoint name
+        requested (bool): result of `is_requested` for the current request
+    """
+    if not (PROFILING_ENABLED and requested):
+        return nullcontext()
+    return _profile(label)
+
+
+def list_profiles() -> list[ProfileInfo]:
+    """List saved profiles, newest first
+
+    Returns:
+        list[ProfileInfo]
+    """
+    if not PROFILE_DIR.exists():
+        return []
+    profiles = []
+    for p in PROFILE_DIR.glob("*.folded"):
+        stat = p.stat()
+        profiles.append(ProfileInfo(name=p.name, size=stat.st_size, created=datetime.fromtimestamp(stat.st_mtime)))
+    profiles.sort(key=lambda p: p.created, reverse=True)
+    return profiles
@@ -0,0 +1,165 @@
+from array import array
+from bisect import bisect_right
+from typing import Self, Sequence
+from geometry import RouteIndex
+
+
+# extra_info types requested from ORS alongside every route
+EXTRA_INFO = ("waytype", "surface", "steepness")
+
+# value labels from the ORS extra_info documentation
+WAYTYPE_LABELS = {
+    0: "Unknown", 1: "State Road", 2: "Road", 3: "Street", 4: "Path", 5: "Track",
+    6: "Cycleway", 7: "Footway", 8: "Steps", 9: "Ferry", 10: "Construction",
+}
+SURFACE_LABELS = {
+    0: "Unknown", 1: "Paved", 2: "Unpaved", 3: "Asphalt", 4: "Concrete", 5: "Cobblestone",
+    6: "Metal", 7: "Wood", 8: "Compacted Gravel", 9: "Fine Gravel", 10: "Gravel", 11: "Dirt",
+    12: "Ground", 13: "Ice", 14: "Paving Stones", 15: "Sand", 16: "Woodchips", 17: "Grass",
+    18: "Grass Paver",
+}
+STEEPNESS_LABELS = {
+    -5: ">16% decline", -4: "12-15% decline", -3: "7-11% decline", -2: "4-6% decline", -1: "1-3% decline",
+    0: "Flat",
+    1: "1-3% incline", 2: "4-6% incline", 3: "7-11% incline", 4: "12-15% incline", 5: ">16% incline",
+}
+LABELS = {"waytype": WAYTYPE_LABELS, "surface": SURFACE_LABELS, "steepness": STEEPNESS_LABELS}
+
+# ORS has no speed limit extra, so road class stands in for it: higher is faster
+ROAD_CLASS_RANK = {1: 3, 2: 2, 3: 1}
+
+
+class RunLengthArray:
+    """Piecewise-constant values over polyline edges, one entry per run
+
+    Run `i` covers the edges between vertices `starts[i]` and `ends[i]`, matching the
+    `[from, to, value]` triples ORS returns in `extras.<type>.values`. Memory and
+    every aggregate below are proportional to the number of runs, not vertices.
+    """
+
+    def __init__(self, starts: Sequence[int]=(), ends: Sequence[int]=(), values: Sequence[int]=()) -> None:
+        self.starts = array("l", starts)
+        self.ends = array("l", ends)
+        self.values = array("h", values)
+
+    @classmethod
+    def from_ors(cls, data: dict) -> Self:
+        """Build from one ORS `extras` entry, e.g. `route["extras"]["waytype"]`"""
+        runs = data.get("values", [])
+        return cls((r[0] for r in runs), (r[1] for r in runs), (r[2] for r in runs))
+
+    def to_ors(self) -> dict:
+        return {"values": [[s, e, v] for s, e, v in zip(self.starts, self.ends, self.values)]}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def concat(cls, parts: Sequence[tuple[Self, int]]) -> Self:
+        """Join per-leg run arrays into one for a stitched polyline
+
+        Args:
+            parts (Sequence[tuple[Self, int]]): each leg's runs with the vertex offset of that leg in the stitched polyline
+
+        Returns:
+            Self
+        """
+        joined = cls()
+        for runs, offset in parts:
+            for s, e, v in zip(runs.starts, runs.ends, runs.values):
+                if len(joined) and joined.values[-1] == v and joined.ends[-1] == s + offset:
+                    # same value carries on across a leg boundary
+                    joined.ends[-1] = e + offset
+                    continue
+                joined.starts.append(s + offset)
+                joined.ends.append(e + offset)
+                joined.values.append(v)
+        return joined
+
+    def slice(self, start: int, end: int) -> Self:
+        """The runs between vertices `start` and `end`, re-indexed so `start` becomes vertex 0
+
+        Runs crossing either bound are clipped to it; used to split a multi-stop route into legs.
+        """
+        part = type(self)()
+        for s, e, v in zip(self.starts, self.ends, self.values):
+            if e <= start or s >= end:
+                continue
+            part.starts.append(max(s, start) - start)
+            part.ends.append(min(e, end) - start)
+            part.values.append(v)
+        return part
+
+    def value_at(self, vertex: int) -> int | None:
+        """Value of the edge leaving `vertex`, found by bisection over run starts"""
+        i = bisect_right(self.starts, vertex) - 1
+        if i < 0 or vertex > self.ends[i]:
+            return None
+        return self.values[i]
+
+    def distance_by_value(self, index: RouteIndex) -> dict[int, float]:
+        """Metres of route per value
+
+        Args:
+            index (RouteIndex): geometry index of the same polyline
+
+        Returns:
+            dict[int, float]
+        """
+        cumdist = index.cumdist
+        totals: dict[int, float] = {}
+        for s, e, v in zip(self.starts, self.ends, self.values):
+            totals[v] = totals.get(v, 0.0) + cumdist[e] - cumdist[s]
+        return totals
+
+    def mix(self, index: RouteIndex) -> dict[int, float]:
+        """Fraction of route distance per value"""
+        totals = self.distance_by_value(index)
+        length = sum(totals.values())
+        return {v: d / length for v, d in totals.items()} if length else {}
+
+    def weighted_mean(self, index: RouteIndex, weights: dict[int, float] | None=None) -> float | None:
+        """Distance-weighted mean of the values, or of `weights[value]` if given
+
+        Values missing from `weights` are left out of the mean.
+        """
+        num = den = 0.0
+        for v, d in self.distance_by_value(index).items():
+            w = v if weights is None else weights.get(v)
+            if w is None:
+                continue
+            num += w * d
+            den += d
+        return num / den if den else None
+
+
+def parse_extras(extras: dict | None) -> dict[str, RunLengthArray]:
+    """Convert an ORS route's `extras` block into run-length arrays keyed by type"""
+    return {name: RunLengthArray.from_ors(data) for name, data in (extras or {}).items()}
+
+
+def summarise_extras(extras: dict[str, RunLengthArray], index: RouteIndex) -> dict:
+    """Distance-weighted road class, surface and steepness mix for the JSON export
+
+    Args:
+        extras (dict[str, RunLengthArray]): the route's parsed extras
+        index (RouteIndex): geometry index of the route
+
+    Returns:
+        dict
+    """
+    summary = {}
+    for name, runs in extras.items():
+        labels = LABELS.get(name, {})
+        mix = runs.mix(index)
+        summary[f"{name}_mix"] = {
+            labels.get(v, str(v)): round(frac, 4) for v, frac in sorted(mix.items(), key=lambda kv: kv[1], reverse=True)
+        }
+    if "waytype" in extras:
+        summary["road_class_score"] = extras["waytype"].weighted_mean(index, ROAD_CLASS_RANK)
+    if "surface" in extras:
+        paved = {v: 1.0 if v in (1, 3, 4) else 0.0 for v in SURFACE_LABELS if v != 0}
+        summary["paved_fraction"] = extras["surface"].weighted_mean(index, paved)
+    if "steepness" in extras:
+        summary["mean_steepness_class"] = extras["steepness"].weighted_mean(index, {v: abs(v) for v in STEEPNESS_LABELS})
+    return summary
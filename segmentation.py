@@ -0,0 +1,176 @@
+import math
+import dataclasses
+from array import array
+from typing import Iterator
+from config import CONFIG
+from geometry import RouteIndex
+from metrics import timed
+
+
+__SEGMENTATION_ROOT = CONFIG.get("segmentation", {})
+
+CORNER_RADIUS_M = __SEGMENTATION_ROOT.get("corner_radius_m", 250)
+MIN_TURN_DEG = __SEGMENTATION_ROOT.get("min_turn_deg", 2)
+STRAIGHTAWAY_MIN_M = __SEGMENTATION_ROOT.get("straightaway_min_m", 400)
+
+STRAIGHT = 0
+CORNER = 1
+
+
+@dataclasses.dataclass
+class Straight:
+    start_index: int
+    end_index: int
+    length: float
+
+
+@dataclasses.dataclass
+class Corner:
+    start_index: int
+    end_index: int
+    length: float
+    radius: float
+    angle: float
+
+    @property
+    def direction(self) -> str:
+        return "left" if self.angle > 0 else "right"
+
+
+class RouteFeatures:
+    """Alternating straights and corners along a route, stored column-wise
+
+    Each feature occupies one slot in parallel arrays: `kinds` (STRAIGHT or CORNER),
+    `start`/`end` vertex indices, `length` in metres, `radius` in metres (inf for
+    straights) and signed `angle` in degrees (positive = left, 0 for straights).
+    Iterating yields typed `Straight`/`Corner` objects.
+    """
+
+    def __init__(self) -> None:
+        self.kinds = array("b")
+        self.start = array("l")
+        self.end = array("l")
+        self.length = array("d")
+        self.radius = array("d")
+        self.angle = array("d")
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __iter__(self) -> Iterator[Straight | Corner]:
+        for i in range(len(self.kinds)):
+            if self.kinds[i] == CORNER:
+                yield Corner(self.start[i], self.end[i], self.length[i], self.radius[i], self.angle[i])
+            else:
+                yield Straight(self.start[i], self.end[i], self.length[i])
+
+    def _append(self, kind: int, start: int, end: int, length: float, radius: float=math.inf, angle: float=0.0) -> None:
+        self.kinds.append(kind)
+        self.start.append(start)
+        self.end.append(end)
+        self.length.append(length)
+        self.radius.append(radius)
+        self.angle.append(angle)
+
+    def corners(self) -> list[Corner]:
+        return [f for f in self if isinstance(f, Corner)]
+
+    def straights(self) -> list[Straight]:
+        return [f for f in self if isinstance(f, Straight)]
+
+    def summary(self, straightaway_min: float=STRAIGHTAWAY_MIN_M) -> dict:
+        """Aggregate features for scoring and the JSON export
+
+        Args:
+            straightaway_min (float, optional): minimum straight length in metres to count as a straightaway. Defaults to STRAIGHTAWAY_MIN_M.
+
+        Returns:
+            dict
+        """
+        corner_radii = [self.radius[i] for i in range(len(self)) if self.kinds[i] == CORNER]
+        straight_lengths = [self.length[i] for i in range(len(self)) if self.kinds[i] == STRAIGHT]
+        return {
+            "corner_count": len(corner_radii),
+            "straightaway_count": sum(1 for l in straight_lengths if l >= straightaway_min),
+            "min_corner_radius_m": min(corner_radii) if corner_radii else None,
+            "avg_corner_radius_m": sum(corner_radii) / len(corner_radii) if corner_radii else None,
+            "longest_straight_m": max(straight_lengths) if straight_lengths else 0,
+            "cornering_distance_m": sum(self.length[i] for i in range(len(self)) if self.kinds[i] == CORNER),
+        }
+
+
+@timed("segment_route")
+def segment_route(index: RouteIndex, corner_radius: float=CORNER_RADIUS_M, min_turn: float=MIN_TURN_DEG) -> RouteFeatures:
+    """Split a route into straights and corners in a single pass
+
+    Every interior vertex gets a radius-of-curvature estimate from the circle through
+    it and its two neighbours. Consecutive vertices tighter than `corner_radius` that
+    turn the same way form one corner; everything between corners is a straight.
+    Feature boundaries sit at edge midpoints, so feature lengths add up to the route length.
+
+    Args:
+        index (RouteIndex): geometry index of the route
+        corner_radius (float, optional): radius in metres below which a vertex is part of a corner. Defaults to CORNER_RADIUS_M.
+        min_turn (float, optional): heading changes below this many degrees are treated as straight. Defaults to MIN_TURN_DEG.
+
+    Returns:
+        RouteFeatures
+    """
+    features = RouteFeatures()
+    n = len(index)
+    if n < 2:
+        return features
+
+    cumdist = index.cumdist
+    bearings = index.bearings
+
+    straight_from = 0.0
+    straight_start = 0
+    corner_start = -1
+    corner_sign = 0
+    corner_radius_min = math.inf
+    corner_angle = 0.0
+
+    def close_corner(last: int) -> None:
+        nonlocal straight_from, straight_start, corner_start
+        begin = (cumdist[corner_start - 1] + cumdist[corner_start]) / 2
+        finish = (cumdist[last] + cumdist[last + 1]) / 2
+        if begin > straight_from:
+            features._append(STRAIGHT, straight_start, corner_start, begin - straight_from)
+        features._append(CORNER, corner_start - 1, last + 1, finish - begin, corner_radius_min, math.degrees(corner_angle))
+        straight_from = finish
+        straight_start = last
+        corner_start = -1
+
+    for i in range(1, n - 1):
+        # heading change at vertex i, positive for a left turn
+        turn = -math.radians((bearings[i] - bearings[i - 1] + 180) % 360 - 180)
+
+        radius = math.inf
+        if abs(math.degrees(turn)) >= min_turn:
+            a = cumdist[i] - cumdist[i - 1]
+            b = cumdist[i + 1] - cumdist[i]
+            # circumradius of the vertex triple: the chord c opposite vertex i over twice the sine of the angle there
+            c = math.sqrt(max(0.0, a * a + b * b + 2 * a * b * math.cos(turn)))
+            # a full reversal has no circumcircle; treat it as the tightest possible corner
+            radius = c / (2 * abs(math.sin(turn))) if abs(turn) < math.pi else 0.0
+
+        sign = 1 if turn > 0 else -1
+        if radius < corner_radius:
+            if corner_start >= 0 and sign != corner_sign:
+                close_corner(i - 1)
+            if corner_start < 0:
+                corner_start = i
+                corner_sign = sign
+                corner_radius_min = radius
+                corner_angle = 0.0
+            corner_radius_min = min(corner_radius_min, radius)
+            corner_angle += turn
+        elif corner_start >= 0:
+            close_corner(i - 1)
+
+    if corner_start >= 0:
+        close_corner(n - 2)
+    if cumdist[-1] > straight_from or not len(features):
+        features._append(STRAIGHT, straight_start, n - 1, cumdist[-1] - straight_from)
+    return features
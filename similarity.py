@@ -0,0 +1,176 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Sequence
+from config import CONFIG
+from geodesy import EARTH_RADIUS_M, haversine
+from metrics import record_cache
+
+
+__SIMILARITY_ROOT = CONFIG.get("similarity", {})
+
+TOLERANCE_M = __SIMILARITY_ROOT.get("tolerance_m", 150)
+MAX_ROUTES = __SIMILARITY_ROOT.get("max_routes", 512)
+MAX_AGE_S = __SIMILARITY_ROOT.get("max_age_s", 3600)
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    """Standard base-32 geohash of a point"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = ch << 1 | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = ch << 1 | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits = ch = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """Height and width in degrees of a geohash cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def precision_for(tolerance: float) -> int:
+    """Finest geohash precision whose cells are at least `tolerance` metres tall
+
+    Cells this size mean a point's neighbours within the tolerance lie in at most a
+    3x3 block of cells, so a lookup only touches a handful of buckets.
+    """
+    precision = 1
+    while precision < 12 and math.radians(cell_size(precision + 1)[0]) * EARTH_RADIUS_M >= tolerance:
+        precision += 1
+    return precision
+
+
+class SimilarityIndex:
+    """Finds a stored route whose stops all lie within a tolerance of a new request's
+
+    Routes are fingerprinted by the geohash cells of their first and last stop and
+    bucketed on that pair. A lookup gathers the cells covering the tolerance box
+    around the requested start and destination, checks those buckets, then compares
+    every stop (via-points included) by great-circle distance. Entries are evicted
+    least-recently-used first once there are `max_routes`, and ignored once older
+    than `max_age` seconds. Hits and misses show up on /metrics as `route_similarity`.
+    """
+
+    def __init__(self, tolerance: float=TOLERANCE_M, max_routes: int=MAX_ROUTES, max_age: float=MAX_AGE_S) -> None:
+        self.tolerance = tolerance
+        self.max_routes = max_routes
+        self.max_age = max_age
+        self.precision = precision_for(tolerance)
+        self._entries: OrderedDict[Hashable, tuple[float, tuple[tuple[float, float], ...], Any]] = OrderedDict()
+        self._buckets: dict[tuple[str, str], set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key_cell(self, stops: Sequence[tuple[float, float]]) -> tuple[str, str]:
+        return geohash(*stops[0], self.precision), geohash(*stops[-1], self.precision)
+
+    def _nearby_cells(self, lat: float, lon: float) -> set[str]:
+        """Cells of every point within the tolerance box around (lat, lon)"""
+        cell_h, cell_w = cell_size(self.precision)
+        dlat = math.degrees(self.tolerance / EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        steps_lat = max(2, math.ceil(2 * dlat / cell_h) + 1)
+        steps_lon = max(2, math.ceil(2 * dlon / cell_w) + 1)
+        return {
+            geohash(lat - dlat + 2 * dlat * i / (steps_lat - 1), lon - dlon + 2 * dlon * j / (steps_lon - 1), self.precision)
+            for i in range(steps_lat) for j in range(steps_lon)
+        }
+
+    def add(self, key: Hashable, stops: Sequence[tuple[float, float]], value: Any) -> None:
+        """Store a computed route
+
+        Args:
+            key (Hashable): unique id of the route, e.g. its session id
+            stops (Sequence[tuple[float, float]]): (lat, lon) of every stop in order
+            value (Any): whatever should be handed back on a match
+        """
+        stops = tuple((float(lat), float(lon)) for lat, lon in stops)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic(), stops, value)
+            self._buckets.setdefault(self._key_cell(stops), set()).add(key)
+            while len(self._entries) > self.max_routes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        cell = self._key_cell(entry[1])
+        bucket = self._buckets.get(cell)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[cell]
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def find(self, stops: Sequence[tuple[float, float]], accept: Callable[[Any], bool] | None=None, record: bool=True) -> Any:
+        """The stored route closest to `stops` with every stop inside the tolerance
+
+        Args:
+            stops (Sequence[tuple[float, float]]): (lat, lon) of every requested stop in order
+            accept (Callable[[Any], bool] | None, optional): further condition a stored value must meet. Defaults to None.
+            record (bool, optional): count the lookup towards the hit rate. Defaults to True.
+
+        Returns:
+            Any: the stored value, or None
+        """
+        now = time.monotonic()
+        starts = self._nearby_cells(*stops[0])
+        dests = self._nearby_cells(*stops[-1])
+        best, best_error = None, math.inf
+        with self._lock:
+            for s in starts:
+                for d in dests:
+                    for key in list(self._buckets.get((s, d), ())):
+                        added, stored, value = self._entries[key]
+                        if now - added > self.max_age:
+                            self._remove(key)
+                            continue
+                        if len(stored) != len(stops) or (accept is not None and not accept(value)):
+                            continue
+                        error = max(haversine(*a, *b) for a, b in zip(stored, stops))
+                        if error <= self.tolerance and error < best_error:
+                            best, best_error = key, error
+            if best is not None:
+                self._entries.move_to_end(best)
+                best = self._entries[best][2]
+        if record:
+            record_cache("route_similarity", best is not None)
+        return best
+
+
+ROUTES = SimilarityIndex()
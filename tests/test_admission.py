@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import LocationSearch
+from admission import PRIORITY_AUTOCOMPLETE, PRIORITY_CALCULATE, Overloaded, Upstream, set_priority, throttled
+from cache import LRUCache
+
+
+def sleeping_stub(latency: float, log: list):
+    """Stands in for an upstream that answers after `latency` seconds"""
+    def call(label):
+        time.sleep(latency)
+        log.append(label)
+        return label
+    return call
+
+
+def drained(rate: float, max_queue: int=50, timeout: float=5, **kwargs) -> Upstream:
+    """An upstream whose burst is already spent, so every new caller has to queue"""
+    upstream = Upstream("test", rate=rate, burst=1, max_queue=max_queue, timeout=timeout, **kwargs)
+    upstream.acquire(priority=PRIORITY_CALCULATE)
+    return upstream
+
+
+def start(upstream: Upstream, priority: int, func, *args, errors: list | None=None) -> threading.Thread:
+    def run():
+        set_priority(priority)
+        try:
+            upstream.call(func, *args)
+        except Overloaded as e:
+            if errors is None:
+                raise
+            errors.append((priority, e.reason))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    # give the caller time to join the queue, so arrival order is deterministic
+    time.sleep(0.01)
+    return thread
+
+
+def test_calculate_served_before_autocomplete():
+    upstream = drained(rate=20)
+    log = []
+    stub = sleeping_stub(0.005, log)
+    priorities = [PRIORITY_AUTOCOMPLETE, PRIORITY_AUTOCOMPLETE, PRIORITY_CALCULATE, PRIORITY_AUTOCOMPLETE, PRIORITY_CALCULATE]
+    threads = [start(upstream, p, stub, f"{p}-{i}") for i, p in enumerate(priorities)]
+    for thread in threads:
+        thread.join()
+    # by priority, then in arrival order
+    assert log == ["0-2", "0-4", "1-0", "1-1", "1-3"]
+
+
+def test_full_queue_evicts_lower_priority():
+    upstream = drained(rate=10, max_queue=3)
+    log, errors = [], []
+    stub = sleeping_stub(0, log)
+    threads = [start(upstream, PRIORITY_AUTOCOMPLETE, stub, f"auto-{i}", errors=errors) for i in range(3)]
+    # a calculation arriving at a full queue takes the newest autocomplete waiter's place
+    threads.append(start(upstream, PRIORITY_CALCULATE, stub, "calc", errors=errors))
+    for thread in threads:
+        thread.join()
+    assert errors == [(PRIORITY_AUTOCOMPLETE, "queue full")]
+    assert log == ["calc", "auto-0", "auto-1"]
+
+
+def test_full_queue_sheds_equal_or_lower_priority_arrival():
+    upstream = drained(rate=10, max_queue=2)
+    log, errors = [], []
+    stub = sleeping_stub(0, log)
+    threads = [start(upstream, PRIORITY_CALCULATE, stub, f"calc-{i}", errors=errors) for i in range(2)]
+    threads.append(start(upstream, PRIORITY_AUTOCOMPLETE, stub, "auto", errors=errors))
+    threads.append(start(upstream, PRIORITY_CALCULATE, stub, "calc-2", errors=errors))
+    for thread in threads:
+        thread.join()
+    assert errors == [(PRIORITY_AUTOCOMPLETE, "queue full"), (PRIORITY_CALCULATE, "queue full")]
+    assert log == ["calc-0", "calc-1"]
+
+
+def test_deadline_expiry():
+    upstream = drained(rate=0.01, autocomplete_timeout=0.05)
+    t0 = time.monotonic()
+    with pytest.raises(Overloaded) as e:
+        upstream.acquire(priority=PRIORITY_CALCULATE, timeout=0.05)
+    assert e.value.reason == "deadline passed"
+    # autocomplete callers give up after their own, shorter timeout
+    with pytest.raises(Overloaded):
+        upstream.acquire(priority=PRIORITY_AUTOCOMPLETE)
+    assert time.monotonic() - t0 < 1
+    # the expired callers left the queue
+    assert not upstream._waiters
+
+
+def test_deadline_expiry_async():
+    upstream = drained(rate=0.01)
+    with pytest.raises(Overloaded) as e:
+        asyncio.run(upstream.acquire_async(priority=PRIORITY_CALCULATE, timeout=0.05))
+    assert e.value.reason == "deadline passed"
+    assert not upstream._waiters
+
+
+def test_async_shares_priority_queue():
+    upstream = drained(rate=20)
+    log = []
+
+    async def waiter(priority: int, label: str) -> None:
+        await upstream.acquire_async(priority=priority)
+        log.append(label)
+
+    async def run() -> None:
+        tasks = []
+        for i, priority in enumerate([PRIORITY_AUTOCOMPLETE, PRIORITY_AUTOCOMPLETE, PRIORITY_CALCULATE]):
+            tasks.append(asyncio.create_task(waiter(priority, f"{priority}-{i}")))
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert log == ["0-2", "1-0", "1-1"]
+
+
+class _Response:
+    def __init__(self, status_code: int) -> None:
+        self.status_code = status_code
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.response = _Response(status_code)
+
+
+class _ClientResponseError(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (Overloaded("photon", "queue full"), True),
+    (_HTTPError(429), True),
+    (_HTTPError(503), True),
+    (_HTTPError(500), False),
+    (_ClientResponseError(429), True),
+    (_ClientResponseError(404), False),
+    (ValueError("boom"), False),
+])
+def test_throttled(exc: BaseException, expected: bool):
+    assert throttled(exc) is expected
+
+
+@pytest.fixture
+def photon(monkeypatch: pytest.MonkeyPatch):
+    """Photon replaced by a stub whose answers can be switched to errors"""
+    responses = []
+
+    def get_json(url, params):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(LocationSearch, "_get_json", get_json)
+    monkeypatch.setitem(LocationSearch.UPSTREAMS, "photon", Upstream("photon", rate=1000, burst=1000, max_queue=10, timeout=1))
+    return responses
+
+
+def test_stale_cache_served_when_throttled(photon: list):
+    cache = LRUCache("test_photon", 8)
+    photon.extend([{"features": ["fresh"]}, _HTTPError(429)])
+    assert LocationSearch._photon_get("photon", "http://photon/api/", {"q": "a"}, cache, ttl=0) == {"features": ["fresh"]}
+    # the entry has expired, but a throttled upstream still gets the stale answer served
+    assert LocationSearch._photon_get("photon", "http://photon/api/", {"q": "a"}, cache, ttl=0) == {"features": ["fresh"]}
+
+
+def test_stale_cache_not_served_for_other_errors(photon: list):
+    cache = LRUCache("test_photon", 8)
+    photon.extend([{"features": ["fresh"]}, _HTTPError(500)])
+    LocationSearch._photon_get("photon", "http://photon/api/", {"q": "a"}, cache, ttl=0)
+    with pytest.raises(_HTTPError):
+        LocationSearch._photon_get("photon", "http://photon/api/", {"q": "a"}, cache, ttl=0)
+
+
+def test_throttled_without_cache_raises(photon: list):
+    photon.append(_HTTPError(429))
+    with pytest.raises(_HTTPError):
+        LocationSearch._photon_get("photon", "http://photon/api/", {"q": "b"}, LRUCache("test_photon", 8), ttl=0)
@@ -0,0 +1,66 @@
+import pytest
+
+import engine
+import similarity
+from cache import LRUCache
+from engine import Location, Point, RouteSession, find_similar, release_exports
+
+
+def test_lru_cache_reports_evictions():
+    evicted = []
+    cache = LRUCache("test", 2, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert evicted == [("b", 2)]
+    assert sorted(cache.values()) == [1, 3]
+
+
+@pytest.fixture
+def exports(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "EXPORT_DIR", tmp_path)
+    monkeypatch.setattr(engine, "SESSIONS", LRUCache("test_sessions", 2, on_evict=lambda key, session: release_exports(session)))
+    monkeypatch.setattr(similarity, "ROUTES", similarity.SimilarityIndex())
+    return tmp_path
+
+
+def session(exports, session_id: str, name: str) -> RouteSession:
+    results = {}
+    for fmt, suffix in (("KML", ".kml"), ("GPX", ".gpx"), ("JSON", "_data.json")):
+        (exports / f"{name}{suffix}").write_text(name)
+        results[fmt] = f"/exports/{name}{suffix}"
+    results["Google Maps"] = "https://www.google.com/maps/dir/"
+    stop = Location(coords=Point(-85.6, 42.9), name="stop")
+    return RouteSession(id=session_id, stops=[stop, stop], legs=[], route=None, results=results, use_blob=False)
+
+
+def test_release_keeps_exports_a_live_session_links_to(exports):
+    old = session(exports, "a", "old")
+    engine.SESSIONS.put("b", RouteSession(**{**vars(old), "id": "b"}))
+    release_exports(old)
+    assert len(list(exports.iterdir())) == 3
+
+    engine.SESSIONS.pop("b")
+    release_exports(old)
+    assert list(exports.iterdir()) == []
+
+
+def test_evicted_sessions_lose_their_exports(exports):
+    for i in range(3):
+        engine.SESSIONS.put(str(i), session(exports, str(i), f"route{i}"))
+    assert sorted(path.name for path in exports.iterdir() if path.suffix == ".kml") == ["route1.kml", "route2.kml"]
+
+
+def test_similarity_index_stores_ids_and_drops_expired_sessions(exports):
+    kept = session(exports, "kept", "kept")
+    engine.SESSIONS.put("kept", kept)
+    similarity.ROUTES.add("gone", [(42.9, -85.6), (42.9, -85.6)], ("gone", False))
+    similarity.ROUTES.add("kept", [(42.9, -85.6), (42.9, -85.6)], ("kept", False))
+    points = [Point(-85.6, 42.9), Point(-85.6, 42.9)]
+
+    assert find_similar(points, use_blob=True) is None
+    assert find_similar(points, use_blob=False) is kept
+    engine.SESSIONS.pop("kept")
+    assert find_similar(points, use_blob=False) is None
+    assert len(similarity.ROUTES) == 0
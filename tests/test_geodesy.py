@@ -0,0 +1,134 @@
+import math
+import random
+
+import pytest
+
+from geodesy import (
+    EARTH_RADIUS_M, DistanceUnit, Point, bearing, cross_track, cross_track_many, destination, destination_many,
+    edge_bearings, edge_lengths, haversine, haversine_many,
+)
+from geometry import RouteIndex
+
+
+# reference values from the worked examples at movable-type.co.uk/scripts/latlong.html and
+# the test suite of its geodesy library; they use R = 6371 km, so distances are compared
+# after rescaling to that radius
+REFERENCE_RADIUS_M = 6371e3
+
+
+def dms(degrees: float, minutes: float=0, seconds: float=0) -> float:
+    sign = -1 if degrees < 0 else 1
+    return sign * (abs(degrees) + minutes / 60 + seconds / 3600)
+
+
+LANDS_END = (dms(50, 3, 59), dms(-5, 42, 53))
+JOHN_O_GROATS = (dms(58, 38, 38), dms(-3, 4, 12))
+CAMBRIDGE = (52.205, 0.119)
+PARIS = (48.857, 2.351)
+
+
+def test_distance():
+    assert haversine(*LANDS_END, *JOHN_O_GROATS, REFERENCE_RADIUS_M) == pytest.approx(968.9e3, abs=50)
+    assert haversine(*CAMBRIDGE, *PARIS, REFERENCE_RADIUS_M) == pytest.approx(404279.164, abs=1e-3)
+
+
+def test_distance_uses_mean_radius():
+    ratio = haversine(*CAMBRIDGE, *PARIS) / haversine(*CAMBRIDGE, *PARIS, REFERENCE_RADIUS_M)
+    assert ratio == pytest.approx(EARTH_RADIUS_M / REFERENCE_RADIUS_M)
+
+
+def test_distance_degenerate():
+    assert haversine(*PARIS, *PARIS) == 0
+    # antipodes are half a circumference apart
+    assert haversine(0, 0, 0, 180) == pytest.approx(math.pi * EARTH_RADIUS_M)
+
+
+def test_initial_bearing():
+    assert bearing(*LANDS_END, *JOHN_O_GROATS) == pytest.approx(dms(9, 7, 11), abs=0.5 / 3600)
+    assert bearing(*CAMBRIDGE, *PARIS) == pytest.approx(156.1666, abs=1e-4)
+
+
+@pytest.mark.parametrize("lat2, lon2, expected", [(1, 0, 0), (0, 1, 90), (-1, 0, 180), (0, -1, 270)])
+def test_bearing_range(lat2: float, lon2: float, expected: float):
+    assert bearing(0, 0, lat2, lon2) == pytest.approx(expected)
+
+
+def test_destination():
+    lat, lon = destination(dms(53, 19, 14), dms(-1, 43, 47), dms(96, 1, 18), 124.8e3, REFERENCE_RADIUS_M)
+    assert lat == pytest.approx(dms(53, 11, 18), abs=0.5 / 3600)
+    assert lon == pytest.approx(dms(0, 8, 0), abs=0.5 / 3600)
+
+    lat, lon = destination(51.47788, -0.00147, 300.7, 7794, REFERENCE_RADIUS_M)
+    assert lat == pytest.approx(51.5136, abs=1e-4)
+    assert lon == pytest.approx(-0.0983, abs=1e-4)
+
+
+def test_destination_wraps_longitude():
+    lat, lon = destination(0, 179.5, 90, math.radians(1) * EARTH_RADIUS_M)
+    assert lat == pytest.approx(0, abs=1e-9)
+    assert lon == pytest.approx(-179.5)
+
+
+def test_cross_track():
+    # positive means right of the path from the first point to the second
+    assert cross_track(53.2611, -0.7972, 53.3206, -1.7297, 53.1887, 0.1334, REFERENCE_RADIUS_M) == pytest.approx(-307.5, abs=0.1)
+    assert cross_track(10, 1, 0, 0, 0, 2) == pytest.approx(-cross_track(-10, 1, 0, 0, 0, 2))
+    assert cross_track(-1, 1, 0, 0, 0, 2) > 0
+
+
+def test_point_distance_units():
+    a, b = Point(*CAMBRIDGE), Point(*PARIS)
+    km = haversine(*CAMBRIDGE, *PARIS) / 1000
+    assert a.distance(b) == pytest.approx(km)
+    assert a.distance(b, DistanceUnit.KILOMETERS) == pytest.approx(km)
+    # both the enum member and its value select miles
+    assert a.distance(b, DistanceUnit.MILES) == pytest.approx(km / 1.609344)
+    assert a.distance(b, "miles") == pytest.approx(km / 1.609344)
+    with pytest.raises(ValueError):
+        a.distance(b, "furlongs")
+
+
+def test_point_bearing():
+    assert Point(*LANDS_END).bearing(Point(*JOHN_O_GROATS)) == pytest.approx(bearing(*LANDS_END, *JOHN_O_GROATS))
+
+
+@pytest.fixture
+def track() -> tuple[list[float], list[float]]:
+    rng = random.Random(0)
+    return [rng.uniform(-80, 80) for _ in range(200)], [rng.uniform(-180, 180) for _ in range(200)]
+
+
+def test_batched_match_scalar(track: tuple[list[float], list[float]]):
+    lats, lons = track
+    pairs = list(zip(lats, lons, lats[1:], lons[1:]))
+
+    assert len(edge_lengths(lats, lons)) == len(pairs)
+    assert list(edge_lengths(lats, lons)) == pytest.approx([haversine(*p) for p in pairs])
+    assert list(edge_bearings(lats, lons)) == pytest.approx([bearing(*p) for p in pairs])
+    assert list(haversine_many(lats, lons, lats[::-1], lons[::-1])) == pytest.approx(
+        [haversine(*a, *b) for a, b in zip(zip(lats, lons), zip(lats[::-1], lons[::-1]))]
+    )
+    assert list(cross_track_many(lats, lons, *CAMBRIDGE, *PARIS)) == pytest.approx(
+        [cross_track(lat, lon, *CAMBRIDGE, *PARIS) for lat, lon in zip(lats, lons)]
+    )
+
+    headings, distances = [b % 360 for b in lons], [abs(a) * 1e4 for a in lats]
+    out_lats, out_lons = destination_many(*PARIS, headings, distances)
+    expected = [destination(*PARIS, h, d) for h, d in zip(headings, distances)]
+    assert list(out_lats) == pytest.approx([lat for lat, _ in expected])
+    assert list(out_lons) == pytest.approx([lon for _, lon in expected])
+
+
+def test_batched_short_input():
+    assert len(edge_lengths([], [])) == 0
+    assert len(edge_lengths([1.0], [2.0])) == 0
+    assert len(edge_bearings([1.0], [2.0])) == 0
+
+
+def test_route_index_reuses_trig(track: tuple[list[float], list[float]]):
+    lats, lons = track
+    index = RouteIndex(list(zip(lats, lons)))
+
+    assert list(index.bearings) == list(edge_bearings(lats, lons))
+    assert index.bearings is index.bearings
+    assert index.cumdist[-1] == pytest.approx(sum(edge_lengths(lats, lons)))
@@ -0,0 +1,210 @@
+import math
+
+import pytest
+
+import engine
+from engine import Location, Point, Route, get_legs, leg_key, missing_chunks, split_route, stitch_routes
+from polycodec import encode
+from roadinfo import RunLengthArray
+
+
+def ors_route(coords: list[tuple[float, float]], vertices: int=5) -> dict:
+    """An ORS directions route through (lon, lat) stops: straight lines, one segment per leg, global indices"""
+    line: list[tuple[float, float]] = []
+    segments, way_points, waytype = [], [0], []
+    for k, ((lon0, lat0), (lon1, lat1)) in enumerate(zip(coords, coords[1:])):
+        first = len(line) - 1 if line else 0
+        leg = [(lat0 + (lat1 - lat0) * i / (vertices - 1), lon0 + (lon1 - lon0) * i / (vertices - 1)) for i in range(vertices)]
+        line.extend(leg[1:] if line else leg)
+        last = len(line) - 1
+        distance = math.dist((lat0, lon0), (lat1, lon1))
+        segments.append({
+            "distance": distance,
+            "duration": 2 * distance,
+            "steps": [
+                {"distance": distance, "duration": 2 * distance, "type": 11, "instruction": f"Leg {k}", "name": f"Road {k}", "way_points": [first, last]},
+                {"distance": 0, "duration": 0, "type": 10, "instruction": "Arrive", "name": "-", "way_points": [last, last]},
+            ],
+        })
+        way_points.append(last)
+        # alternate road class per leg, and split the first half of each leg off as a separate run
+        middle = first + 2
+        waytype += [[first, middle, 1 + k % 2], [middle, last, 1 + k % 2]]
+    lats, lons = [c[0] for c in line], [c[1] for c in line]
+    return {
+        "summary": {"distance": sum(s["distance"] for s in segments), "duration": sum(s["duration"] for s in segments)},
+        "segments": segments,
+        "bbox": [min(lons), min(lats), max(lons), max(lats)],
+        "geometry": encode(line),
+        "way_points": way_points,
+        "extras": {"waytype": {"values": waytype}, "surface": {"values": [[0, len(line) - 1, 3]]}},
+    }
+
+
+def parse(data: dict) -> Route:
+    return engine._parse_directions({"bbox": data["bbox"], "routes": [data], "metadata": {}}).routes[0]
+
+
+STOPS = [(-85.60, 42.90), (-85.55, 42.95), (-85.50, 42.93), (-85.40, 42.99)]
+
+
+# --- RunLengthArray ---------------------------------------------------------------------------
+
+def runs(*triples: tuple[int, int, int]) -> RunLengthArray:
+    return RunLengthArray.from_ors({"values": [list(t) for t in triples]})
+
+
+def test_concat_offsets_and_merges_across_legs():
+    joined = RunLengthArray.concat([(runs((0, 2, 1), (2, 4, 3)), 0), (runs((0, 3, 3), (3, 5, 2)), 4)])
+    # value 3 carries on across the junction at vertex 4
+    assert joined.to_ors()["values"] == [[0, 2, 1], [2, 7, 3], [7, 9, 2]]
+
+
+def test_concat_keeps_equal_values_apart_when_not_adjacent():
+    joined = RunLengthArray.concat([(runs((0, 2, 1)), 0), (runs((1, 3, 1)), 4)])
+    assert joined.to_ors()["values"] == [[0, 2, 1], [5, 7, 1]]
+
+
+def test_concat_empty():
+    assert len(RunLengthArray.concat([])) == 0
+    assert RunLengthArray.concat([(runs(), 0), (runs((0, 1, 5)), 3)]).to_ors()["values"] == [[3, 4, 5]]
+
+
+def test_slice_clips_and_reindexes():
+    whole = runs((0, 3, 1), (3, 8, 2), (8, 10, 3))
+    assert whole.slice(2, 9).to_ors()["values"] == [[0, 1, 1], [1, 6, 2], [6, 7, 3]]
+    assert whole.slice(3, 8).to_ors()["values"] == [[0, 5, 2]]
+    assert len(whole.slice(10, 12)) == 0
+
+
+def test_slice_then_concat_round_trip():
+    whole = runs((0, 3, 1), (3, 8, 2), (8, 10, 3))
+    parts = [(whole.slice(a, b), a) for a, b in [(0, 4), (4, 8), (8, 10)]]
+    assert RunLengthArray.concat(parts).to_ors() == whole.to_ors()
+
+
+# --- split_route / stitch_routes ----------------------------------------------------------------
+
+def test_split_route_reindexes_each_leg():
+    route = parse(ors_route(STOPS))
+    legs = split_route(route)
+    assert len(legs) == len(STOPS) - 1
+    for k, leg in enumerate(legs):
+        assert leg.way_points == [0, 4]
+        assert len(leg.polyline) == 5
+        assert leg.polyline[0] == route.polyline[route.way_points[k]]
+        assert leg.polyline[-1] == route.polyline[route.way_points[k + 1]]
+        assert [st.way_points for st in leg.segments[0].steps] == [[0, 4], [4, 4]]
+        assert leg.extras["waytype"].to_ors()["values"] == [[0, 2, 1 + k % 2], [2, 4, 1 + k % 2]]
+        assert leg.summary == {"distance": route.segments[k].distance, "duration": route.segments[k].duration}
+        lats, lons = leg.polyline.lats(), leg.polyline.lons()
+        assert leg.bbox == [min(lons), min(lats), max(lons), max(lats)]
+        assert leg.geometry == encode(leg.polyline)
+
+
+def test_split_route_single_leg_is_unchanged():
+    route = parse(ors_route(STOPS[:2]))
+    assert split_route(route) == [route]
+
+
+def test_stitch_routes_remaps_indices():
+    legs = [parse(ors_route(pair)) for pair in zip(STOPS, STOPS[1:])]
+    route = stitch_routes(legs)
+
+    # shared junction vertices are kept once
+    assert len(route.polyline) == 1 + 4 * len(legs)
+    assert route.way_points == [0, 4, 8, 12]
+    assert [[st.way_points for st in seg.steps] for seg in route.segments] == [
+        [[0, 4], [4, 4]], [[4, 8], [8, 8]], [[8, 12], [12, 12]],
+    ]
+    assert route.summary["distance"] == pytest.approx(sum(leg.summary["distance"] for leg in legs))
+    assert route.summary["duration"] == pytest.approx(sum(leg.summary["duration"] for leg in legs))
+    assert route.bbox == [min(s[0] for s in STOPS), min(s[1] for s in STOPS), max(s[0] for s in STOPS), max(s[1] for s in STOPS)]
+    assert route.geometry == encode(route.polyline)
+    # every separately fetched leg has the same road class, so all runs merge into one
+    assert route.extras["waytype"].to_ors()["values"] == [[0, 12, 1]]
+    assert route.extras["surface"].to_ors()["values"] == [[0, 12, 3]]
+
+
+def test_stitch_then_split_matches_multi_stop_answer():
+    whole = parse(ors_route(STOPS))
+    stitched = stitch_routes(split_route(whole))
+    assert stitched.polyline == whole.polyline
+    assert stitched.way_points == whole.way_points
+    assert [[st.way_points for st in seg.steps] for seg in stitched.segments] == [[st.way_points for st in seg.steps] for seg in whole.segments]
+    assert stitched.extras["surface"].to_ors() == whole.extras["surface"].to_ors()
+
+
+def test_stitch_single_leg():
+    leg = parse(ors_route(STOPS[:2]))
+    assert stitch_routes([leg]) is leg
+
+
+# --- chunked fetching ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("legs, max_stops, expected", [
+    ([None] * 29, 50, [(0, 29)]),
+    ([None] * 29, 10, [(0, 8), (8, 15), (15, 22), (22, 29)]),
+    ([None] * 10, 6, [(0, 5), (5, 10)]),
+    ([None, "a", None, None, "b"], 50, [(0, 1), (2, 4)]),
+    (["a", "b"], 50, []),
+    ([], 50, []),
+    ([None] * 3, 2, [(0, 1), (1, 2), (2, 3)]),
+])
+def test_missing_chunks(legs: list, max_stops: int, expected: list):
+    assert missing_chunks(legs, max_stops) == expected
+
+
+@pytest.fixture
+def ors(monkeypatch: pytest.MonkeyPatch) -> list:
+    """ORS replaced by a stub answering every directions request instantly; records each request's stops"""
+    requests = []
+
+    def get_directions(start, dest, via=(), **kwargs):
+        stops = [start, *via, dest]
+        requests.append(stops)
+        return engine._parse_directions({"bbox": [], "routes": [ors_route([s.coords.to_tuple() for s in stops])], "metadata": {}})
+
+    monkeypatch.setattr(engine, "get_directions", get_directions)
+    monkeypatch.setattr(engine, "LEG_CACHE", engine.LRUCache("test_legs", 1024))
+    return requests
+
+
+def stops(n: int) -> list[Location]:
+    return [Location(coords=Point(-85.6 + i * 0.01, 42.9 + (i % 3) * 0.01), name=f"stop {i}") for i in range(n)]
+
+
+def test_many_stops_in_one_request(ors: list):
+    route_stops = stops(30)
+    legs = get_legs(route_stops)
+    assert len(ors) == 1 and len(ors[0]) == 30
+    assert len(legs) == 29
+    for a, b, leg in zip(route_stops, route_stops[1:], legs):
+        assert leg.polyline[0] == pytest.approx((a.coords.lon, a.coords.lat))
+        assert leg.polyline[-1] == pytest.approx((b.coords.lon, b.coords.lat))
+
+
+def test_chunks_fetched_and_cached(ors: list, monkeypatch: pytest.MonkeyPatch):
+    route_stops = stops(30)
+    # the max_stops default is bound at import, so cap it where get_legs looks missing_chunks up
+    monkeypatch.setattr(engine, "missing_chunks", lambda legs: missing_chunks(legs, 10))
+    first = get_legs(route_stops)
+    # chunks are fetched in parallel, so requests can arrive in any order
+    assert sorted(len(r) for r in ors) == [8, 8, 8, 9]
+    # every leg is cached, so the same stops cost no further requests
+    ors.clear()
+    assert get_legs(route_stops) == first
+    assert ors == []
+
+
+def test_only_changed_legs_refetched(ors: list):
+    route_stops = stops(6)
+    legs = get_legs(route_stops)
+    previous = {leg_key(a, b): leg for a, b, leg in zip(route_stops, route_stops[1:], legs)}
+    moved = list(route_stops)
+    moved[3] = Location(coords=Point(-85.0, 43.5), name="moved")
+    ors.clear()
+    new_legs = get_legs(moved, previous)
+    # legs 2 and 3 touch the moved stop and are fetched together
+    assert [[s.name for s in r] for r in ors] == [["stop 2", "moved", "stop 4"]]
+    assert new_legs[:2] == legs[:2] and new_legs[4:] == legs[4:]
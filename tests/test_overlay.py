@@ -0,0 +1,58 @@
+import json
+import random
+
+import pytest
+
+import overlay
+from overlay import TILE_SIZE, TOLERANCE_PX, bucket_edges, project
+
+
+def crosses(ax: float, ay: float, bx: float, by: float, x0: float, y0: float, x1: float, y1: float) -> bool:
+    """Whether segment a-b meets the rectangle, by Liang-Barsky clipping"""
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-(bx - ax), ax - x0), (bx - ax, x1 - ax), (-(by - ay), ay - y0), (by - ay, y1 - ay)):
+        if p == 0:
+            if q < 0:
+                return False
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+    return t0 <= t1
+
+
+@pytest.fixture
+def route() -> list[tuple[float, float]]:
+    rng = random.Random(1)
+    lat, lon, coords = 42.9, -85.6, []
+    for _ in range(60):
+        lat, lon = lat + rng.uniform(-0.05, 0.05), lon + rng.uniform(-0.08, 0.08)
+        coords.append((lat, lon))
+    return coords
+
+
+@pytest.mark.parametrize("z", [8, 11, 13])
+def test_buckets_hold_the_edges_near_each_tile(route: list[tuple[float, float]], z: int):
+    xs, ys = project(route)
+    buckets = bucket_edges(xs, ys, z)
+    scale, pad = 2 ** z, TOLERANCE_PX / TILE_SIZE
+    edges = [(xs[i] * scale, ys[i] * scale, xs[i + 1] * scale, ys[i + 1] * scale) for i in range(len(xs) - 1)]
+    tiles = {(tx, ty) for ax, ay, bx, by in edges for tx in range(int(min(ax, bx)) - 1, int(max(ax, bx)) + 2) for ty in range(int(min(ay, by)) - 1, int(max(ay, by)) + 2)}
+
+    for tx, ty in tiles:
+        box = (tx - pad, ty - pad, tx + 1 + pad, ty + 1 + pad)
+        found = list(buckets.get((tx, ty), ()))
+        assert found == sorted(found)
+        # every edge that really runs through the tile, and none whose bounding box misses it
+        assert {i for i, e in enumerate(edges) if crosses(*e, *box)} <= set(found)
+        assert set(found) <= {i for i, (ax, ay, bx, by) in enumerate(edges) if min(ax, bx) <= box[2] and max(ax, bx) >= box[0] and min(ay, by) <= box[3] and max(ay, by) >= box[1]}
+
+
+def test_tile_splits_lines_where_the_route_leaves(monkeypatch):
+    monkeypatch.setattr(overlay, "TILES", overlay.LRUCache("test_tiles", 16))
+    monkeypatch.setattr(overlay, "PYRAMID", overlay.LRUCache("test_levels", 16))
+    # a loop that leaves tile 2/2/1 (lon 0-90, lat 0-66.5) for an edge wholly in 2/3/1 and comes back
+    coords = [(5.0, 5.0), (40.0, 30.0), (10.0, 150.0), (20.0, 170.0), (50.0, 60.0), (5.0, 5.0)]
+    _, body = overlay.tile("route", "geometry", coords, 2, 2, 1)
+    lines = json.loads(body)["geometry"]["coordinates"]
+    assert lines == [[[5.0, 5.0], [30.0, 40.0], [150.0, 10.0]], [[170.0, 20.0], [60.0, 50.0], [5.0, 5.0]]]
@@ -0,0 +1,115 @@
+import math
+import random
+
+import polyline
+import pytest
+
+from polycodec import Polyline, decode, decode_range, encode, vertex_count
+
+
+# the worked example from Google's encoded polyline format documentation
+GOOGLE_EXAMPLE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+GOOGLE_COORDS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def random_coords(rng: random.Random, n: int) -> list[tuple[float, float]]:
+    return [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(n)]
+
+
+def drive(rng: random.Random, n: int, start: tuple[float, float]=(42.96, -85.65)) -> list[tuple[float, float]]:
+    """A route-like walk: short, mostly forward steps the way ORS geometries look"""
+    lat, lon = start
+    heading = rng.uniform(0, 2 * math.pi)
+    coords = []
+    for _ in range(n):
+        coords.append((round(lat, 5), round(lon, 5)))
+        heading += rng.gauss(0, 0.2)
+        step = rng.uniform(1e-5, 5e-4)
+        lat += step * math.cos(heading)
+        lon += step * math.sin(heading)
+    return coords
+
+
+def test_google_example():
+    assert encode(GOOGLE_COORDS) == GOOGLE_EXAMPLE
+    assert decode(GOOGLE_EXAMPLE) == GOOGLE_COORDS
+
+
+def test_empty():
+    # polyline.encode raises on empty input, so there is no reference value to compare with
+    assert encode([]) == ""
+    assert len(decode("")) == 0
+    assert list(decode("")) == polyline.decode("")
+    assert vertex_count("") == 0
+    assert len(decode_range(GOOGLE_EXAMPLE, 2, 1)) == 0
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+@pytest.mark.parametrize("seed", range(20))
+def test_random_matches_reference(seed: int, precision: int):
+    rng = random.Random(seed)
+    coords = random_coords(rng, rng.randint(1, 200))
+    encoded = encode(coords, precision)
+    assert encoded == polyline.encode(coords, precision)
+    assert decode(encoded, precision) == polyline.decode(encoded, precision)
+    assert vertex_count(encoded) == len(coords)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_route_like_matches_reference(seed: int):
+    rng = random.Random(seed)
+    coords = drive(rng, 5000)
+    encoded = encode(coords)
+    assert encoded == polyline.encode(coords)
+    decoded = decode(encoded)
+    assert decoded == polyline.decode(encoded)
+    # 5-decimal input survives the round trip
+    assert all(abs(a - c) < 1e-9 and abs(b - d) < 1e-9 for (a, b), (c, d) in zip(decoded, coords))
+
+
+@pytest.mark.parametrize("precision", [0, 1, 5, 6, 7])
+def test_rounding_edges(precision: int):
+    half = 0.5 / 10 ** precision
+    values = [0.0, -0.0, half, -half, 3 * half, -3 * half, 1 - half, -(1 - half), 89.999995, -89.999995, 179.999995, -179.999995, 90.0, -90.0, 180.0, -180.0]
+    coords = [(a, b) for a in values for b in values[::-1]][:len(values) * 4]
+    encoded = encode(coords, precision)
+    assert encoded == polyline.encode(coords, precision)
+    assert decode(encoded, precision) == polyline.decode(encoded, precision)
+
+
+def test_large_deltas():
+    # consecutive vertices on opposite sides of the globe need the longest chunk runs
+    coords = [(90, 180), (-90, -180), (90, -180), (-90, 180), (0, 0)]
+    encoded = encode(coords)
+    assert encoded == polyline.encode(coords)
+    assert decode(encoded) == coords
+
+
+def test_encode_accepts_polyline():
+    coords = drive(random.Random(1), 100)
+    assert encode(Polyline.from_coords(coords)) == polyline.encode(coords)
+
+
+@pytest.mark.parametrize("start, stop", [(0, None), (0, 1), (10, 20), (99, None), (-5, None), (0, -1), (50, 10), (0, 1000)])
+def test_decode_range(start: int, stop: int | None):
+    coords = drive(random.Random(2), 100)
+    encoded = encode(coords)
+    reference = polyline.decode(encoded)
+    assert decode_range(encoded, start, stop) == reference[start:stop]
+
+
+def test_polyline_sequence():
+    coords = polyline.decode(encode(drive(random.Random(3), 50)))
+    line = Polyline.from_coords(coords)
+    assert len(line) == 50
+    assert line[0] == coords[0] and line[-1] == coords[-1]
+    assert line[5:10] == coords[5:10]
+    assert line[::7] == coords[::7]
+    assert list(line) == coords
+    assert list(line.lats()) == [c[0] for c in coords]
+    assert list(line.lons()) == [c[1] for c in coords]
+    with pytest.raises(IndexError):
+        line[50]
+
+    line.extend(coords[:3])
+    assert len(line) == 53 and line[50:] == coords[:3]